@@ -0,0 +1,144 @@
+"""
+Buffered access-log writer.
+Records are queued by the caller and written in batches by a background
+thread, so slow disks never hold up recognition. Supports the classic
+text format or JSON lines, and rotation by size or by day.
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+_STOP = object()
+
+
+class AccessLogWriter:
+    def __init__(self, path="access_logs.txt", flush_interval=1.0, flush_size=50,
+                 json_lines=False, rotate_bytes=None, rotate_daily=False, echo=True):
+        """
+        Records are written when flush_size are waiting or flush_interval
+        seconds after the first one arrived, whichever comes first.
+        rotate_bytes and rotate_daily start a new file by size or date.
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.json_lines = json_lines
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+        self.echo = echo
+
+        self._queue = queue.Queue()
+        self._day = self._file_day()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="access-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, name, status, score=None, stream_id=None):
+        """Queue one access record. Never touches the disk."""
+        if self._closed:
+            return
+        self._queue.put({
+            "timestamp": datetime.now(),
+            "user": name,
+            "status": status,
+            "score": None if score is None else round(float(score), 4),
+            "stream_id": stream_id,
+        })
+
+    def flush(self, timeout=5.0):
+        """Wait until everything queued so far is on disk"""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        """Write whatever is left and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout=5.0)
+
+    def format(self, record):
+        """One line of the log file for a record"""
+        timestamp = record["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
+        if self.json_lines:
+            return json.dumps(dict(record, timestamp=timestamp)) + "\n"
+        return f"[{timestamp}] User: {record['user']} | Status: {record['status']}\n"
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._write(batch)
+                return
+            if isinstance(item, threading.Event):
+                self._write(batch)
+                batch = []
+                item.set()
+                continue
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+
+            if batch and (len(batch) >= self.flush_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self._rotate_if_needed(batch[0]["timestamp"])
+            with open(self.path, "a") as f:
+                f.writelines(self.format(record) for record in batch)
+            if self.echo:
+                for record in batch:
+                    print(f" >> Logged: {self.format(record).strip()}")
+        except Exception as e:
+            print(f"Error writing to log: {e}")
+
+    def _file_day(self):
+        try:
+            return datetime.fromtimestamp(os.path.getmtime(self.path)).date()
+        except OSError:
+            return None
+
+    def _rotate_if_needed(self, now):
+        if not os.path.exists(self.path):
+            self._day = now.date()
+            return
+
+        base, ext = os.path.splitext(self.path)
+        if self.rotate_daily and self._day is not None and now.date() != self._day:
+            target = f"{base}.{self._day.isoformat()}{ext}"
+        elif self.rotate_bytes and os.path.getsize(self.path) >= self.rotate_bytes:
+            target = f"{base}.{now.strftime('%Y%m%d-%H%M%S')}{ext}"
+        else:
+            self._day = self._day or now.date()
+            return
+
+        # Never overwrite an earlier rotation
+        n = 1
+        candidate = target
+        while os.path.exists(candidate):
+            candidate = f"{os.path.splitext(target)[0]}.{n}{ext}"
+            n += 1
+        os.replace(self.path, candidate)
+        self._day = now.date()
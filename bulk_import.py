@@ -0,0 +1,347 @@
+"""
+Bulk import of photos into the training photos folder.
+Reads images from folders, zip archives or tar archives (.tar, .tar.gz,
+.tgz, .tar.bz2, .tar.xz) straight from the archive without extracting
+them. Name and ID come from a CSV manifest, or from the usual Name_ID.jpg
+filename. Faces are detected, aligned and cropped in worker processes and
+written as face templates (Name_ID.faceNN.png, see enrollment.py), so
+load_database never has to detect them again.
+
+Every finished file is appended to a checkpoint, so an interrupted import
+run again with the same command carries on where it stopped. Files that
+failed ("No face detected", "Unreadable image", ...) are listed in a CSV
+report.
+
+    python bulk_import.py hr_export.zip --manifest employees.csv --workers 4
+    python bulk_import.py new_staff/ archive.tar.gz
+"""
+
+import argparse
+import csv
+import json
+import os
+import tarfile
+import time
+import zipfile
+
+import cv2
+import numpy as np
+
+from enrollment import align_face, largest_face, template_indexes
+from gallery_watcher import IMAGE_EXTENSIONS
+from user_registry import DEFAULT_ID, parse_user_filename, template_filename
+
+TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+def iter_source(source):
+    """
+    Yield (member, read) for every image in a folder, zip or tar archive,
+    where member is its path inside the source and read() returns its
+    bytes. Call read() before asking for the next item (tar archives are
+    read as a stream), or not at all to skip the file.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for filename in sorted(files):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, filename)
+                    yield os.path.relpath(path, source).replace(os.sep, "/"), _file_reader(path)
+    elif source.lower().endswith('.zip'):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    yield info.filename, (lambda info=info: archive.read(info))
+    elif source.lower().endswith(TAR_EXTENSIONS):
+        with tarfile.open(source, "r|*") as archive:
+            for info in archive:
+                if info.isfile() and info.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield info.name, (lambda info=info: archive.extractfile(info).read())
+    else:
+        raise ValueError(f"'{source}' is not a folder, zip or tar archive")
+
+
+def _file_reader(path):
+    def read():
+        with open(path, "rb") as f:
+            return f.read()
+    return read
+
+
+def load_manifest(path, file_column="file", name_column="name", id_column="id"):
+    """{file: (name, user_id)} from a CSV with a header row"""
+    manifest = {}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        missing = {file_column, name_column, id_column} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"Manifest '{path}' has no column(s): {', '.join(sorted(missing))}")
+        for row in reader:
+            manifest[row[file_column].strip().replace("\\", "/")] = (row[name_column], row[id_column])
+    return manifest
+
+
+def clean_name(name):
+    """A person's name made safe for a Name_ID filename"""
+    kept = "".join(c if c.isalnum() or c in " -'." else " " for c in name.replace("_", " "))
+    return " ".join(kept.split()).strip(".")
+
+
+def person_for(member, manifest=None):
+    """
+    (name, user_id, error) for an image, from the manifest (by path inside
+    the source, then by filename) or else from its Name_ID filename.
+    """
+    filename = os.path.basename(member)
+    row = None
+    if manifest:
+        row = manifest.get(member) or manifest.get(filename)
+    if row is not None:
+        name, user_id = row[0], row[1].strip()
+    else:
+        name, user_id = parse_user_filename(filename)
+        if user_id == DEFAULT_ID and not filename.rsplit('.', 1)[0].endswith("_" + DEFAULT_ID):
+            return None, None, "No ID in manifest or filename"
+
+    name = clean_name(name)
+    if not name:
+        return None, None, "No name"
+    if not user_id.isdigit():
+        return None, None, f"ID '{user_id}' is not a number"
+    return name, user_id, None
+
+
+# Cascades owned by each worker process
+_cascades = None
+
+
+def _load_cascades():
+    global _cascades
+    _cascades = (cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'),
+                 cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml'))
+
+
+def _init_worker():
+    """Set up an import process: its own cascades, no nested OpenCV threads"""
+    cv2.setNumThreads(1)
+    _load_cascades()
+
+
+def crop_face(data, max_side=1024):
+    """
+    Decode image bytes and crop their largest face to an aligned 100x100
+    grayscale template. Big photos are shrunk to max_side first, since the
+    template is small anyway. Returns (face_img, error).
+    """
+    if _cascades is None:
+        _load_cascades()
+    face_cascade, eye_cascade = _cascades
+
+    gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return None, "Unreadable image"
+    scale = max_side / float(max(gray.shape[:2]))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+    if len(faces) == 0:
+        return None, "No face detected"
+    return align_face(gray, largest_face(faces), eye_cascade)[0], None
+
+
+class BulkImporter:
+    def __init__(self, folder="training photos", manifest=None, workers=1,
+                 checkpoint="bulk_import_checkpoint.jsonl", report="bulk_import_failures.csv",
+                 max_side=1024, retry_failed=False, progress_every=500):
+        """
+        manifest is {file: (name, user_id)} (see load_manifest). workers > 1
+        detects faces in that many processes; 0 means one per CPU core.
+        checkpoint records every finished file; report lists the failures.
+        """
+        self.folder = folder
+        self.manifest = manifest
+        self.workers = workers or os.cpu_count() or 1
+        self.checkpoint = checkpoint
+        self.report = report
+        self.max_side = max_side
+        self.retry_failed = retry_failed
+        self.progress_every = progress_every
+
+        self.records = {}
+        self.stats = {"imported": 0, "failed": 0, "skipped": 0}
+        self._taken = {}
+        self._log = None
+        self._cut_short = False
+        self._started_at = None
+
+    def _load_checkpoint(self):
+        """Records of files finished by earlier runs, by key"""
+        records = {}
+        self._cut_short = False
+        try:
+            with open(self.checkpoint) as f:
+                for line in f:
+                    self._cut_short = not line.endswith("\n")
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by an interrupted run
+                    records[record["key"]] = record
+        except OSError:
+            pass
+        if self.retry_failed:
+            records = {key: record for key, record in records.items() if record["status"] == "imported"}
+        return records
+
+    def run(self, sources):
+        """Import every image of the sources. Returns the stats."""
+        os.makedirs(self.folder, exist_ok=True)
+        self.records = self._load_checkpoint()
+        if self.records:
+            print(f"✓ Checkpoint: {len(self.records)} file(s) already done, resuming")
+        self._taken = template_indexes(self.folder)
+        self._started_at = time.perf_counter()
+
+        pool = None
+        if self.workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+            print(f"Detecting faces with {self.workers} workers...")
+
+        self._log = open(self.checkpoint, "a")
+        if self._cut_short:
+            self._log.write("\n")
+        try:
+            pending = {}
+            for source in sources:
+                self._import_source(source, pool, pending)
+            self._drain(pending, 0)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            self._log.close()
+            self._write_report()
+        return self.stats
+
+    def _import_source(self, source, pool, pending):
+        try:
+            files = iter_source(source)
+            for member, read in files:
+                key = f"{os.path.abspath(source)}:{member}"
+                if key in self.records:
+                    self.stats["skipped"] += 1
+                    continue
+
+                name, user_id, error = person_for(member, self.manifest)
+                data = None
+                if error is None:
+                    try:
+                        data = read()
+                    except (OSError, tarfile.TarError, zipfile.BadZipFile) as e:
+                        error = f"Could not read: {e}"
+                job = {"key": key, "source": source, "file": member, "name": name, "id": user_id}
+                if error is not None:
+                    self._finish(job, None, error)
+                elif pool is None:
+                    self._finish(job, *crop_face(data, self.max_side))
+                else:
+                    pending[pool.submit(crop_face, data, self.max_side)] = job
+                    # Keep only a few images in memory per worker
+                    self._drain(pending, self.workers * 4)
+        except (OSError, ValueError, tarfile.TarError, zipfile.BadZipFile) as e:
+            print(f"Error: Could not read '{source}': {e}")
+
+    def _drain(self, pending, limit):
+        """Finish completed jobs until at most limit are still running"""
+        from concurrent.futures import FIRST_COMPLETED, wait
+        while len(pending) > limit:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = pending.pop(future)
+                try:
+                    self._finish(job, *future.result())
+                except Exception as e:
+                    self._finish(job, None, f"Worker failed: {e}")
+
+    def _finish(self, job, face_img, error):
+        """Write a template for a found face and checkpoint the file"""
+        record = dict(job, status="failed", detail=error or "", template="")
+        if face_img is not None:
+            person = (job["name"], job["id"])
+            index = self._taken.get(person, 0) + 1
+            filename = template_filename(job["name"], job["id"], index)
+            if cv2.imwrite(os.path.join(self.folder, filename), face_img):
+                self._taken[person] = index
+                record.update(status="imported", template=filename)
+            else:
+                record["detail"] = "Could not write template"
+
+        self.records[record["key"]] = record
+        self._log.write(json.dumps(record) + "\n")
+        self._log.flush()
+        self.stats[record["status"]] += 1
+
+        finished = self.stats["imported"] + self.stats["failed"]
+        if self.progress_every and finished % self.progress_every == 0:
+            rate = finished / max(time.perf_counter() - self._started_at, 1e-9)
+            print(f"  {finished} file(s): {self.stats['imported']} imported, "
+                  f"{self.stats['failed']} failed ({rate:.1f} files/s)")
+
+    def _write_report(self):
+        """Every failed file, from this run and earlier ones"""
+        failed = [record for record in self.records.values() if record["status"] == "failed"]
+        try:
+            with open(self.report, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["source", "file", "name", "id", "error"])
+                for record in failed:
+                    writer.writerow([record["source"], record["file"], record["name"] or "",
+                                     record["id"] or "", record["detail"]])
+        except OSError as e:
+            print(f"Warning: Could not write report '{self.report}': {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import photos in bulk from folders or archives")
+    parser.add_argument("sources", nargs="+", help="folders, .zip or .tar(.gz/.bz2/.xz) archives")
+    parser.add_argument("--database", default="training photos", help="photo folder to import into")
+    parser.add_argument("--manifest", metavar="CSV",
+                        help="CSV with file, name and id columns; otherwise Name_ID.jpg filenames are used")
+    parser.add_argument("--file-column", default="file", help="manifest column with the file path")
+    parser.add_argument("--name-column", default="name", help="manifest column with the name")
+    parser.add_argument("--id-column", default="id", help="manifest column with the ID")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="face detection processes (0 = one per CPU core)")
+    parser.add_argument("--checkpoint", default="bulk_import_checkpoint.jsonl",
+                        help="progress file; rerun the same command to resume")
+    parser.add_argument("--report", default="bulk_import_failures.csv", help="CSV of files that failed")
+    parser.add_argument("--max-side", type=int, default=1024,
+                        help="shrink bigger photos to this many pixels before detection")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="try files that failed in an earlier run again")
+    args = parser.parse_args()
+
+    manifest = None
+    if args.manifest:
+        try:
+            manifest = load_manifest(args.manifest, args.file_column, args.name_column, args.id_column)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error: Could not read manifest: {e}")
+            raise SystemExit(1)
+        print(f"✓ Manifest: {len(manifest)} row(s)")
+
+    importer = BulkImporter(args.database, manifest, args.workers, args.checkpoint, args.report,
+                            args.max_side, args.retry_failed)
+    started = time.perf_counter()
+    try:
+        stats = importer.run(args.sources)
+    except KeyboardInterrupt:
+        print("\nInterrupted - run the same command again to resume.")
+        raise SystemExit(1)
+
+    print(f"\n✓ Import: {stats['imported']} imported, {stats['failed']} failed, "
+          f"{stats['skipped']} already done ({time.perf_counter() - started:.1f}s)")
+    if stats["failed"] or any(r["status"] == "failed" for r in importer.records.values()):
+        print(f"  Failures are listed in {args.report}")
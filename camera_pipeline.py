@@ -0,0 +1,247 @@
+"""
+Threaded camera pipeline: capture -> detection -> recognition.
+Stages are connected by small bounded queues that drop the oldest frame
+when full, so slow recognition never stalls the camera or the display.
+"""
+
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from metrics import Metrics
+
+
+class DropOldestQueue:
+    def __init__(self, maxsize=1):
+        """Bounded queue that discards its oldest item instead of blocking"""
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.closed = False
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item):
+        """Add an item, dropping the oldest one if the queue is full. Returns True if one was dropped."""
+        with self._cond:
+            dropped = len(self._items) >= self.maxsize
+            if dropped:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+        return dropped
+
+    def get(self, timeout=None):
+        """Wait for the next item. Returns None on timeout or when closed."""
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+    def get_nowait(self):
+        """Next item, or None if the queue is empty"""
+        with self._cond:
+            return self._items.popleft() if self._items else None
+
+    def close(self):
+        """Wake up anyone waiting so the pipeline can shut down"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class FramePipeline:
+    def __init__(self, video_capture, detect_fn, recognize_fn, queue_size=1,
+                 recognition_pool=None, stream_id=None, metrics=None):
+        """
+        detect_fn(frame_id, frame, gray) returns face boxes.
+        recognize_fn(frame_id, gray, faces) returns [(box, name, score), ...].
+        With recognition_pool (a concurrent.futures executor shared between
+        pipelines) recognition runs there, one frame in flight per pipeline,
+        instead of on a dedicated thread. Stage timings and counters go to
+        metrics (see metrics.py) when it is enabled.
+        """
+        self.video_capture = video_capture
+        self.detect_fn = detect_fn
+        self.recognize_fn = recognize_fn
+        self.recognition_pool = recognition_pool
+        self.stream_id = stream_id
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        self.frame_queue = DropOldestQueue(queue_size)
+        self.detection_queue = DropOldestQueue(queue_size)
+        self.result_queue = DropOldestQueue(queue_size)
+
+        # Latest output of each stage, read by the display loop
+        self.latest_frame = None     # (frame_id, frame)
+        self.latest_faces = (0, ())  # (frame_id, faces)
+        self.latest_results = (0, [])  # (frame_id, results)
+
+        self.counts = {"captured": 0, "detected": 0, "recognized": 0}
+        self.latencies = deque(maxlen=500)  # capture -> recognition result, seconds
+        self.started_at = None
+        self.error = None
+        self.running = False
+        self._threads = []
+        self._frame_ready = threading.Condition()
+        self._in_flight = False
+        self._in_flight_lock = threading.Lock()
+
+    def start(self):
+        """Start the capture, detection and recognition threads"""
+        self.running = True
+        self.started_at = time.time()
+        stages = [(self._capture_loop, "capture"), (self._detect_loop, "detect")]
+        if self.recognition_pool is None:
+            stages.append((self._recognize_loop, "recognize"))
+        for target, name in stages:
+            if self.stream_id is not None:
+                name = f"{name}-{self.stream_id}"
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop all stages and wait for them to exit"""
+        self.running = False
+        for q in (self.frame_queue, self.detection_queue, self.result_queue):
+            q.close()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+    def _capture_loop(self):
+        frame_id = 0
+        while self.running:
+            with self.metrics.timer("capture"):
+                ret, frame = self.video_capture.read()
+            if not ret:
+                self.error = "Could not read from camera."
+                self.running = False
+                break
+
+            frame_id += 1
+            self.counts["captured"] += 1
+            self.metrics.count("frames")
+            with self._frame_ready:
+                self.latest_frame = (frame_id, frame)
+                self._frame_ready.notify_all()
+            if self.frame_queue.put((frame_id, frame, time.time())):
+                self.metrics.count("dropped_frames")
+
+        self.frame_queue.close()
+        with self._frame_ready:
+            self._frame_ready.notify_all()
+
+    def _detect_loop(self):
+        while self.running:
+            item = self.frame_queue.get(timeout=0.5)
+            if item is None:
+                continue
+
+            frame_id, frame, captured_at = item
+            try:
+                with self.metrics.timer("convert"):
+                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                with self.metrics.timer("detect"):
+                    faces = self.detect_fn(frame_id, frame, gray)
+            except Exception as e:
+                # One bad frame must not stop detection for the rest of the run
+                print(f"Error in detection: {e}")
+                continue
+            self.counts["detected"] += 1
+            self.metrics.count("faces_detected", len(faces))
+            self.latest_faces = (frame_id, faces)
+
+            if len(faces) > 0:
+                if self.detection_queue.put((frame_id, frame, gray, faces, captured_at)):
+                    self.metrics.count("dropped_frames")
+                if self.recognition_pool is not None:
+                    self._schedule_recognition()
+            else:
+                # Nobody in view: stop drawing the last people's labels
+                self.latest_results = (frame_id, [])
+
+    def _recognize_loop(self):
+        while self.running:
+            item = self.detection_queue.get(timeout=0.5)
+            if item is None:
+                continue
+            try:
+                self._recognize(item)
+            except Exception as e:
+                # One bad frame must not stop recognition for the rest of the run
+                print(f"Error in recognition: {e}")
+
+    def _recognize(self, item):
+        frame_id, frame, gray, faces, captured_at = item
+        with self.metrics.timer("recognize"):
+            results = self.recognize_fn(frame_id, gray, faces)
+        self.counts["recognized"] += 1
+        self.latencies.append(time.time() - captured_at)
+        # A frame recognized after the scene emptied must not bring its labels back
+        if frame_id > self.latest_results[0]:
+            self.latest_results = (frame_id, results)
+        self.result_queue.put((frame_id, frame, results))
+
+    def _schedule_recognition(self):
+        """Hand the newest detection to the shared pool unless one is already running"""
+        with self._in_flight_lock:
+            if self._in_flight or not self.running:
+                return
+            item = self.detection_queue.get_nowait()
+            if item is None:
+                return
+            self._in_flight = True
+        self.recognition_pool.submit(self._run_pooled, item)
+
+    def _run_pooled(self, item):
+        try:
+            self._recognize(item)
+        except Exception as e:
+            print(f"Error in recognition ({self.stream_id}): {e}")
+        finally:
+            with self._in_flight_lock:
+                self._in_flight = False
+        # Pick up whatever was detected while this frame was being recognized
+        self._schedule_recognition()
+
+    def stats(self):
+        """Per-stage frame counts, queue depth and drop counts"""
+        elapsed = max(time.time() - self.started_at, 1e-6) if self.started_at else None
+        latencies = np.asarray(self.latencies) * 1000.0
+        return {
+            "fps": round(self.counts["captured"] / elapsed, 2) if elapsed else 0.0,
+            "detect_fps": round(self.counts["detected"] / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {"p50": round(float(np.percentile(latencies, 50)), 1),
+                           "p95": round(float(np.percentile(latencies, 95)), 1)}
+                          if len(latencies) else None,
+            "capture": {"frames": self.counts["captured"],
+                        "queue_depth": len(self.frame_queue),
+                        "dropped": self.frame_queue.dropped},
+            "detect": {"frames": self.counts["detected"],
+                       "queue_depth": len(self.detection_queue),
+                       "dropped": self.detection_queue.dropped},
+            "recognize": {"frames": self.counts["recognized"],
+                          "queue_depth": len(self.result_queue),
+                          "dropped": self.result_queue.dropped},
+        }
+
+    def wait_for_frame(self, last_id, timeout=1.0):
+        """Wait for a frame newer than last_id. Returns (frame_id, frame) or None."""
+        def ready():
+            latest = self.latest_frame
+            return not self.running or (latest is not None and latest[0] != last_id)
+
+        with self._frame_ready:
+            self._frame_ready.wait_for(ready, timeout)
+            latest = self.latest_frame
+        if latest is None or latest[0] == last_id:
+            return None
+        return latest
@@ -1,12 +1,16 @@
 """
 Simple photo capture - no face detection required
-Just press SPACE to capture your photo
+Just press SPACE to capture your photo, or B for a burst of face templates
 """
 
+import argparse
 import cv2
 import os
 
-def capture_photo():
+from enrollment import BurstEnroller, add_burst_arguments, burst_settings, report_burst
+
+def capture_photo(burst=None):
+    """burst holds BurstEnroller settings for the B key (see enrollment.py)"""
     print("\n" + "="*60)
     print("  SIMPLE PHOTO CAPTURE")
     print("="*60)
@@ -27,6 +31,7 @@ def capture_photo():
     print("\n" + "="*60)
     print("CAMERA CONTROLS:")
     print("  SPACE = Capture photo")
+    print("  B = Burst: several face templates in a few seconds")
     print("  ESC = Cancel")
     print("="*60)
     
@@ -46,14 +51,30 @@ def capture_photo():
     print("\n✓ Camera opened successfully!")
     print("Position yourself and press SPACE to capture...\n")
     
+    enroller = None
+    face_detector = None
+    
     while True:
         ret, frame = cap.read()
         if not ret:
             print("❌ Error: Could not read from camera")
             break
         
+        # Faces are only looked for during a burst
+        if enroller is not None:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            faces = face_detector.detect(gray)
+            for (x, y, w, h) in faces:
+                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+            if enroller.step(gray, faces, frame):
+                written = enroller.finish()
+                report_burst(enroller)
+                cap.release()
+                cv2.destroyAllWindows()
+                return bool(written)
+        
         # Simple display with instructions
-        cv2.putText(frame, "SPACE: Capture | ESC: Cancel", (10, 30),
+        cv2.putText(frame, "SPACE: Capture | B: Burst | ESC: Cancel", (10, 30),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
         cv2.putText(frame, "Position yourself in frame", (10, 60),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
@@ -62,7 +83,15 @@ def capture_photo():
         
         key = cv2.waitKey(1) & 0xFF
         
-        if key == 32:  # SPACE
+        if key in (ord('b'), ord('B')) and enroller is None:
+            from face_detection import ScaledFaceDetector
+            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            face_detector = ScaledFaceDetector(face_cascade, scales=(0.5, 1.0))
+            enroller = BurstEnroller(folder, name, user_id, **(burst or {}))
+            enroller.start()
+            print("Burst started - look at the camera and turn your head slightly...")
+        
+        elif key == 32 and enroller is None:  # SPACE
             cv2.imwrite(filename, frame)
             print(f"\n✓ Photo saved: {filename}")
             print(f"✓ Name: {name.replace('_', ' ')}")
@@ -72,6 +101,9 @@ def capture_photo():
             return True
         
         elif key == 27:  # ESC
+            if enroller is not None:
+                enroller.finish()
+                report_burst(enroller)
             print("\n❌ Cancelled")
             cap.release()
             cv2.destroyAllWindows()
@@ -82,7 +114,11 @@ def capture_photo():
     return False
 
 if __name__ == "__main__":
-    if capture_photo():
+    parser = argparse.ArgumentParser(description="Capture a database photo from the webcam")
+    add_burst_arguments(parser)
+    args = parser.parse_args()
+    
+    if capture_photo(burst_settings(args)):
         print("\n" + "="*60)
         print("SUCCESS! Photo captured.")
         print("\nAdd more people? Run this script again.")
@@ -3,12 +3,17 @@ Photo capture with GUI dialogs
 No terminal input required!
 """
 
+import argparse
 import cv2
 import os
 import tkinter as tk
 from tkinter import simpledialog, messagebox
 
-def capture_photo_gui():
+from enrollment import BurstEnroller, add_burst_arguments, burst_settings, report_burst
+from face_detection import ScaledFaceDetector
+
+def capture_photo_gui(burst=None):
+    """burst holds BurstEnroller settings for the B key (see enrollment.py)"""
     # Create hidden root window for dialogs
     root = tk.Tk()
     root.withdraw()
@@ -50,6 +55,7 @@ def capture_photo_gui():
                        "Camera will open next.\n\n"
                        "Controls:\n"
                        "  • SPACE = Capture photo\n"
+                       "  • B = Burst: several face templates in a few seconds\n"
                        "  • ESC = Cancel\n\n"
                        "Position yourself and press SPACE!")
     
@@ -67,6 +73,9 @@ def capture_photo_gui():
     print("Press SPACE to capture photo...\n")
     
     captured = False
+    saved_as = f"{name}_{user_id}.jpg"
+    enroller = None
+    face_detector = None
     
     while True:
         ret, frame = cap.read()
@@ -74,12 +83,25 @@ def capture_photo_gui():
             print("❌ Error: Could not read from camera")
             break
         
+        # Faces are only looked for during a burst
+        if enroller is not None:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            faces = face_detector.detect(gray)
+            for (x, y, w, h) in faces:
+                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+            if enroller.step(gray, faces, frame):
+                written = enroller.finish()
+                report_burst(enroller)
+                captured = bool(written)
+                saved_as = f"{len(written)} face templates ({name}_{user_id}.faceNN.png)"
+                break
+        
         # Add text overlay
         cv2.putText(frame, f"User: {name.replace('_', ' ')}", (10, 30),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
         cv2.putText(frame, f"ID: {user_id}", (10, 65),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-        cv2.putText(frame, "SPACE: Capture | ESC: Cancel", (10, frame.shape[0] - 20),
+        cv2.putText(frame, "SPACE: Capture | B: Burst | ESC: Cancel", (10, frame.shape[0] - 20),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
         
         # Draw center crosshair to help positioning
@@ -91,13 +113,23 @@ def capture_photo_gui():
         
         key = cv2.waitKey(1) & 0xFF
         
-        if key == 32:  # SPACE
+        if key in (ord('b'), ord('B')) and enroller is None:
+            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            face_detector = ScaledFaceDetector(face_cascade, scales=(0.5, 1.0))
+            enroller = BurstEnroller(folder, name, user_id, **(burst or {}))
+            enroller.start()
+            print("Burst started - look at the camera and turn your head slightly...")
+        
+        elif key == 32 and enroller is None:  # SPACE
             cv2.imwrite(filename, frame)
             print(f"\n✅ Photo saved: {filename}")
             captured = True
             break
         
         elif key == 27:  # ESC
+            if enroller is not None:
+                enroller.finish()
+                report_burst(enroller)
             print("\n❌ Cancelled by user")
             break
     
@@ -107,15 +139,15 @@ def capture_photo_gui():
     if captured:
         messagebox.showinfo("Success!", 
                           f"Photo captured successfully!\n\n"
-                          f"Saved as: {name}_{user_id}.jpg\n\n"
+                          f"Saved as: {saved_as}\n\n"
                           f"Add more people or run the security system.")
         return True
     else:
         return False
 
-def main():
+def main(burst=None):
     while True:
-        if capture_photo_gui():
+        if capture_photo_gui(burst):
             # Ask if user wants to add another person
             root = tk.Tk()
             root.withdraw()
@@ -134,4 +166,6 @@ def main():
             break
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Capture database photos with GUI dialogs")
+    add_burst_arguments(parser)
+    main(burst_settings(parser.parse_args()))
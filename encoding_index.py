@@ -0,0 +1,153 @@
+"""
+Matrix-backed index of 128-d face encodings for FaceIDSystem.
+Encodings live in one preallocated float32 matrix with a name array
+beside it, and a batch of probe faces is matched with a single matrix
+product. Large galleries can build an IVF index (k-means partitions)
+so each lookup only scans a few partitions.
+"""
+
+import numpy as np
+
+
+class EncodingIndex:
+    def __init__(self, dim=128, capacity=1024):
+        self.dim = dim
+        self.size = 0
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.sq_norms = np.zeros(capacity, dtype=np.float32)
+        self.labels = np.zeros(capacity, dtype=np.int32)
+        self.label_names = []
+        self._label_of = {}
+
+        # IVF partitions, see build_ivf(). Rows are copied in partition
+        # order so every partition is one contiguous block.
+        self.centroids = None
+        self.list_offsets = None
+        self.list_rows = None
+        self.ivf_matrix = None
+        self.ivf_sq_norms = None
+        self.indexed_size = 0
+        self.nprobe = 1
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def encodings(self):
+        return self.matrix[:self.size]
+
+    @property
+    def names(self):
+        return [self.label_names[label] for label in self.labels[:self.size]]
+
+    def add(self, encoding, name):
+        """Append one encoding, growing the matrix by doubling when full"""
+        if self.size == len(self.matrix):
+            grow = max(len(self.matrix), 1)
+            self.matrix = np.vstack([self.matrix, np.zeros((grow, self.dim), dtype=np.float32)])
+            self.sq_norms = np.concatenate([self.sq_norms, np.zeros(grow, dtype=np.float32)])
+            self.labels = np.concatenate([self.labels, np.zeros(grow, dtype=np.int32)])
+
+        if name not in self._label_of:
+            self._label_of[name] = len(self.label_names)
+            self.label_names.append(name)
+
+        encoding = np.asarray(encoding, dtype=np.float32)
+        self.matrix[self.size] = encoding
+        self.sq_norms[self.size] = encoding @ encoding
+        self.labels[self.size] = self._label_of[name]
+        self.size += 1
+
+    @staticmethod
+    def _distances(probes, matrix, sq_norms):
+        """Euclidean distances from each probe to each row of matrix"""
+        probe_norms = np.einsum("ij,ij->i", probes, probes)[:, None]
+        squared = probe_norms + sq_norms[None, :] - 2.0 * (probes @ matrix.T)
+        return np.sqrt(np.maximum(squared, 0.0))
+
+    def _best(self, distances, labels, tolerance):
+        """Best match, distance and margin over the runner-up identity"""
+        best = int(np.argmin(distances))
+        best_distance = float(distances[best])
+        label = labels[best]
+
+        others = distances[labels != label]
+        margin = float(others.min() - best_distance) if len(others) else float("inf")
+
+        if best_distance <= tolerance:
+            return self.label_names[label], best_distance, margin
+        return None, best_distance, margin
+
+    def search(self, probes, tolerance=0.6):
+        """
+        Match a batch of encodings in one pass.
+        Returns [(name or None, distance, margin), ...], one per probe.
+        """
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, self.dim)
+        if len(probes) == 0:
+            return []
+        if self.size == 0:
+            return [(None, float("inf"), float("inf")) for _ in probes]
+
+        if self.centroids is not None:
+            return [self._search_ivf(probe, tolerance) for probe in probes]
+
+        labels = self.labels[:self.size]
+        distances = self._distances(probes, self.encodings, self.sq_norms[:self.size])
+        return [self._best(row, labels, tolerance) for row in distances]
+
+    def build_ivf(self, n_lists=None, nprobe=4, iterations=10, seed=0):
+        """
+        Partition the encodings with k-means so a lookup only scans the
+        nprobe closest partitions. Encodings added afterwards are still
+        searched exhaustively until the index is rebuilt.
+        """
+        n = self.size
+        if n == 0:
+            return
+        n_lists = min(n_lists or max(int(np.sqrt(n)), 1), n)
+        data = self.encodings
+
+        rng = np.random.default_rng(seed)
+        centroids = data[rng.choice(n, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = self._nearest_centroid(data, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, data)
+            counts = np.bincount(assignment, minlength=n_lists)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        assignment = self._nearest_centroid(data, centroids)
+        order = np.argsort(assignment, kind="stable")
+        self.centroids = centroids
+        self.list_rows = order
+        self.ivf_matrix = np.ascontiguousarray(data[order])
+        self.ivf_sq_norms = self.sq_norms[order]
+        self.list_offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        self.indexed_size = n
+        self.nprobe = nprobe
+
+    @staticmethod
+    def _nearest_centroid(data, centroids):
+        squared = (np.einsum("ij,ij->i", centroids, centroids)[None, :]
+                   - 2.0 * (data @ centroids.T))
+        return np.argmin(squared, axis=1)
+
+    def _search_ivf(self, probe, tolerance):
+        nearest = np.argsort(np.linalg.norm(self.centroids - probe, axis=1))[:self.nprobe]
+        probe = probe[None, :]
+
+        distances, labels = [], []
+        for i in nearest:
+            start, end = self.list_offsets[i], self.list_offsets[i + 1]
+            distances.append(self._distances(probe, self.ivf_matrix[start:end], self.ivf_sq_norms[start:end])[0])
+            labels.append(self.labels[self.list_rows[start:end]])
+
+        # Encodings added after the last build are not partitioned yet
+        if self.size > self.indexed_size:
+            tail = slice(self.indexed_size, self.size)
+            distances.append(self._distances(probe, self.matrix[tail], self.sq_norms[tail])[0])
+            labels.append(self.labels[tail])
+
+        return self._best(np.concatenate(distances), np.concatenate(labels), tolerance)
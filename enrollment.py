@@ -0,0 +1,216 @@
+"""
+Burst enrollment for the capture tools.
+Instead of saving one full-resolution frame that the loader has to search
+for a face at every start, a burst watches the camera for a few seconds
+and keeps up to N frames of the face that are sharp and differ from the
+ones already kept. Each kept face is cropped and aligned (eyes level)
+once and written to the gallery as a small template, e.g.
+John_Doe_5555.face01.png, that load_database only resizes.
+
+Cropping, aligning and writing happen on a background thread, so the
+preview keeps running at camera speed during the burst.
+"""
+
+import math
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from face_gallery import FACE_SIZE
+from user_registry import parse_user_filename, template_filename, template_index
+
+_STOP = object()
+
+
+def sharpness(gray):
+    """Variance of the Laplacian; low values mean a blurry or smeared image"""
+    return cv2.Laplacian(gray, cv2.CV_64F).var()
+
+
+def align_face(gray, box, eye_cascade=None, max_tilt=20.0):
+    """
+    Crop a face box to FACE_SIZE, first rotating it so the eyes are level
+    when eye_cascade finds both eyes. Returns (face_img, aligned).
+    """
+    x, y, w, h = (int(v) for v in box[:4])
+    if eye_cascade is not None:
+        upper = gray[y:y + h // 2, x:x + w]
+        eyes = eye_cascade.detectMultiScale(upper, 1.1, 5, minSize=(max(w // 8, 1), max(w // 8, 1)))
+        if len(eyes) >= 2:
+            eyes = sorted(sorted(eyes, key=lambda e: e[2] * e[3])[-2:], key=lambda e: e[0])
+            (lx, ly, lw, lh), (rx, ry, rw, rh) = eyes
+            angle = math.degrees(math.atan2((ry + rh / 2.0) - (ly + lh / 2.0),
+                                            (rx + rw / 2.0) - (lx + lw / 2.0)))
+            if abs(angle) <= max_tilt:
+                rotation = cv2.getRotationMatrix2D((x + w / 2.0, y + h / 2.0), angle, 1.0)
+                rotated = cv2.warpAffine(gray, rotation, (gray.shape[1], gray.shape[0]),
+                                         flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+                return cv2.resize(rotated[y:y + h, x:x + w], FACE_SIZE), True
+    return cv2.resize(gray[y:y + h, x:x + w], FACE_SIZE), False
+
+
+def template_indexes(folder):
+    """{(name, user_id): highest template number} for the templates in a folder"""
+    taken = {}
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                index = template_index(entry.name)
+                if index is not None:
+                    person = parse_user_filename(entry.name)
+                    taken[person] = max(taken.get(person, 0), index)
+    except OSError:
+        pass
+    return taken
+
+
+def next_template_index(folder, name, user_id):
+    """First free template number for a person, so new bursts add to old ones"""
+    return template_indexes(folder).get((name, user_id), 0) + 1
+
+
+class BurstEnroller:
+    def __init__(self, folder, name, user_id, count=5, seconds=3.0, min_sharpness=40.0,
+                 min_difference=6.0, margin=0.25):
+        """
+        Keep up to count faces seen within seconds of start(). A face is
+        rejected as blurry below min_sharpness, or as a near-duplicate when
+        its 32x32 thumbnail differs from every kept one by less than
+        min_difference gray levels on average. margin pads the region kept
+        for alignment, as a share of the face size.
+        """
+        self.folder = folder
+        self.name = name.strip().replace('_', ' ')
+        self.user_id = user_id
+        self.count = count
+        self.seconds = seconds
+        self.min_sharpness = min_sharpness
+        self.min_difference = min_difference
+        self.margin = margin
+
+        self.started_at = None
+        self.stats = {"offered": 0, "kept": 0, "blurry": 0, "duplicate": 0}
+        self.written = []
+        self.errors = []
+        self._thumbs = []
+        self._next_index = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._closed = False
+
+    def start(self, now=None):
+        """Begin the burst and the writer thread"""
+        os.makedirs(self.folder, exist_ok=True)
+        self._next_index = next_template_index(self.folder, self.name, self.user_id)
+        self.started_at = time.monotonic() if now is None else now
+        self._thread = threading.Thread(target=self._run, name="enrollment-writer", daemon=True)
+        self._thread.start()
+
+    def done(self, now=None):
+        """Whether enough faces were kept or the burst ran out of time"""
+        now = time.monotonic() if now is None else now
+        return self.stats["kept"] >= self.count or now - self.started_at >= self.seconds
+
+    def offer(self, gray, box):
+        """
+        Consider one detected face of a grayscale frame. Returns "kept",
+        "blurry" or "duplicate". Kept faces are queued for the writer.
+        """
+        self.stats["offered"] += 1
+        x, y, w, h = (int(v) for v in box[:4])
+        face = gray[y:y + h, x:x + w]
+        if sharpness(cv2.resize(face, FACE_SIZE)) < self.min_sharpness:
+            self.stats["blurry"] += 1
+            return "blurry"
+
+        thumb = cv2.resize(face, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+        if any(np.mean(np.abs(thumb - kept)) < self.min_difference for kept in self._thumbs):
+            self.stats["duplicate"] += 1
+            return "duplicate"
+        self._thumbs.append(thumb)
+
+        # Hand the writer only the area around the face, not the whole frame
+        pad_w, pad_h = int(w * self.margin), int(h * self.margin)
+        x0, y0 = max(x - pad_w, 0), max(y - pad_h, 0)
+        x1, y1 = min(x + w + pad_w, gray.shape[1]), min(y + h + pad_h, gray.shape[0])
+        path = os.path.join(self.folder, template_filename(self.name, self.user_id, self._next_index))
+        self._next_index += 1
+        self._queue.put((path, gray[y0:y1, x0:x1].copy(), (x - x0, y - y0, w, h)))
+        self.stats["kept"] += 1
+        return "kept"
+
+    def step(self, gray, faces, frame=None):
+        """
+        One preview frame of the burst: offer its largest face and draw the
+        progress on frame. Returns True once the burst is done.
+        """
+        face = largest_face(faces)
+        if face is not None:
+            self.offer(gray, face)
+        if frame is not None:
+            cv2.putText(frame, f"Burst: {self.stats['kept']}/{self.count} faces - move your head slightly",
+                        (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+        return self.done()
+
+    def finish(self, timeout=10.0):
+        """Wait for every kept face to be written. Returns the written paths."""
+        if self._thread is not None and not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        return list(self.written)
+
+    def _run(self):
+        eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+        if eye_cascade.empty():
+            eye_cascade = None
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            path, region, box = item
+            face_img, _ = align_face(region, box, eye_cascade)
+            try:
+                if not cv2.imwrite(path, face_img):
+                    raise OSError("cv2.imwrite failed")
+                self.written.append(path)
+            except (OSError, cv2.error) as e:
+                self.errors.append(f"{os.path.basename(path)}: {e}")
+
+
+def largest_face(faces):
+    """The biggest (x, y, w, h) box, or None"""
+    return max(faces, key=lambda face: face[2] * face[3]) if len(faces) else None
+
+
+def report_burst(enroller):
+    """Print what a finished burst kept and wrote"""
+    stats = enroller.stats
+    print(f"\n✓ Burst: {len(enroller.written)} face template(s) saved for "
+          f"{enroller.name} (ID: {enroller.user_id})")
+    print(f"  {stats['offered']} frames checked, {stats['blurry']} blurry, "
+          f"{stats['duplicate']} near-duplicates")
+    for path in enroller.written:
+        print(f"  - {os.path.basename(path)}")
+    for error in enroller.errors:
+        print(f"Warning: Could not save {error}")
+
+
+def add_burst_arguments(parser):
+    """Add the burst enrollment flags to an argparse parser"""
+    parser.add_argument("--burst-count", type=int, default=5,
+                        help="face templates to keep per burst (default 5)")
+    parser.add_argument("--burst-seconds", type=float, default=3.0,
+                        help="how long a burst watches the camera (default 3)")
+    parser.add_argument("--min-sharpness", type=float, default=40.0,
+                        help="reject faces blurrier than this Laplacian variance (default 40)")
+
+
+def burst_settings(args):
+    """BurstEnroller keyword arguments from the add_burst_arguments flags"""
+    return {"count": args.burst_count, "seconds": args.burst_seconds,
+            "min_sharpness": args.min_sharpness}
@@ -0,0 +1,197 @@
+"""
+Multi-resolution face detection.
+Runs the Haar cascade on a downscaled copy of the frame, with face size
+limits derived from how far people stand from the camera, then maps the
+boxes back to full resolution.
+
+Calibrate the scale settings on a folder of sample frames:
+    python face_detection.py --calibrate sample_frames --scales 1 0.5 0.33
+"""
+
+import argparse
+import math
+import os
+import time
+
+import cv2
+import numpy as np
+
+# Average adult face width in meters
+FACE_WIDTH_M = 0.15
+
+
+def face_size_range(frame_width, distance_range, fov_degrees=60.0):
+    """
+    Expected face width in pixels for people between distance_range[0]
+    and distance_range[1] meters from a camera with the given horizontal
+    field of view. Returns (min_size, max_size).
+    """
+    focal_px = (frame_width / 2.0) / math.tan(math.radians(fov_degrees) / 2.0)
+    near, far = distance_range
+    return (int(focal_px * FACE_WIDTH_M / far), int(math.ceil(focal_px * FACE_WIDTH_M / near)))
+
+
+class ScaledFaceDetector:
+    def __init__(self, face_cascade, scales=(1.0,), scale_factor=1.3, min_neighbors=5,
+                 distance_range=None, fov_degrees=60.0, margin=0.25):
+        """
+        scales is the detector pyramid, tried in order until one level finds
+        a face, e.g. (0.5, 1.0) checks half resolution first and falls back
+        to full resolution. distance_range=(near, far) in meters limits the
+        face sizes searched for; margin widens those limits a little.
+        """
+        self.face_cascade = face_cascade
+        self.scales = tuple(scales)
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.distance_range = distance_range
+        self.fov_degrees = fov_degrees
+        self.margin = margin
+        self._size_limits = {}
+
+    def size_limits(self, frame_width):
+        """Full-resolution (min_size, max_size) for a frame width, or (None, None)"""
+        if self.distance_range is None:
+            return None, None
+
+        if frame_width not in self._size_limits:
+            min_size, max_size = face_size_range(frame_width, self.distance_range, self.fov_degrees)
+            self._size_limits[frame_width] = (int(min_size * (1 - self.margin)),
+                                              int(max_size * (1 + self.margin)))
+        return self._size_limits[frame_width]
+
+    def detect_at(self, gray, scale, frame_width=None):
+        """
+        Detect faces at one pyramid level, returning full-resolution boxes.
+        Pass frame_width when gray is a region cut from a wider frame, so the
+        face size limits still match the camera.
+        """
+        small = gray
+        if scale != 1.0:
+            small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        kwargs = {}
+        min_size, max_size = self.size_limits(frame_width or gray.shape[1])
+        if min_size is not None:
+            side = max(int(min_size * scale), 1)
+            kwargs["minSize"] = (side, side)
+            side = max(int(max_size * scale), 1)
+            kwargs["maxSize"] = (side, side)
+
+        faces = self.face_cascade.detectMultiScale(small, self.scale_factor, self.min_neighbors, **kwargs)
+        if len(faces) == 0:
+            return np.zeros((0, 4), dtype=np.int32)
+
+        faces = np.asarray(faces, dtype=np.float32)
+        if scale != 1.0:
+            faces = faces / scale
+        # Keep boxes inside the full-resolution frame
+        height, width = gray.shape[:2]
+        faces = np.round(faces).astype(np.int32)
+        faces[:, 0] = np.clip(faces[:, 0], 0, width - 1)
+        faces[:, 1] = np.clip(faces[:, 1], 0, height - 1)
+        faces[:, 2] = np.minimum(faces[:, 2], width - faces[:, 0])
+        faces[:, 3] = np.minimum(faces[:, 3], height - faces[:, 1])
+        return faces
+
+    def detect(self, gray, frame_width=None):
+        """Detect faces, trying each pyramid level until one finds something"""
+        faces = np.zeros((0, 4), dtype=np.int32)
+        for scale in self.scales:
+            faces = self.detect_at(gray, scale, frame_width)
+            if len(faces) > 0:
+                break
+        return faces
+
+    def clone(self):
+        """
+        A detector with the same settings and its own frontal face cascade.
+        Cascades are not shared between threads, so each thread that
+        detects needs its own.
+        """
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        return ScaledFaceDetector(cascade, scales=self.scales, scale_factor=self.scale_factor,
+                                  min_neighbors=self.min_neighbors, distance_range=self.distance_range,
+                                  fov_degrees=self.fov_degrees, margin=self.margin)
+
+
+def clip_box(box, width, height):
+    """An (x, y, w, h) box cut to a width x height frame, or None if nothing is left"""
+    x, y, w, h = (int(v) for v in box[:4])
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, width), min(y + h, height)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ix = max(0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def calibrate(folder, face_cascade, scales, distance_range=None, fov_degrees=60.0, iou=0.4):
+    """
+    Measure detection time and recall for each scale on a folder of frames.
+    Full-resolution detection without size limits is the reference.
+    """
+    frames = [os.path.join(folder, f) for f in sorted(os.listdir(folder))
+              if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp'))]
+    grays = []
+    for path in frames:
+        img = cv2.imread(path)
+        if img is None:
+            print(f"Warning: Could not load {path}")
+            continue
+        grays.append(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+
+    if not grays:
+        print(f"Error: No frames found in '{folder}'.")
+        return []
+
+    reference = ScaledFaceDetector(face_cascade)
+    truth = [reference.detect(gray) for gray in grays]
+    total = sum(len(t) for t in truth)
+
+    results = []
+    for scale in scales:
+        detector = ScaledFaceDetector(face_cascade, scales=(scale,),
+                                      distance_range=distance_range, fov_degrees=fov_degrees)
+        found = 0
+        start = time.perf_counter()
+        detections = [detector.detect(gray) for gray in grays]
+        elapsed = time.perf_counter() - start
+
+        for boxes, expected in zip(detections, truth):
+            for box in expected:
+                if any(box_iou(box, other) >= iou for other in boxes):
+                    found += 1
+
+        results.append({
+            "scale": scale,
+            "ms_per_frame": 1000.0 * elapsed / len(grays),
+            "recall": found / total if total else 1.0,
+            "faces": int(sum(len(d) for d in detections)),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate downscaled face detection")
+    parser.add_argument("--calibrate", required=True, metavar="FOLDER",
+                        help="folder of sample camera frames")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.75, 0.5, 0.33, 0.25])
+    parser.add_argument("--distance", type=float, nargs=2, metavar=("NEAR", "FAR"),
+                        help="expected distance range to the gate, in meters")
+    parser.add_argument("--fov", type=float, default=60.0, help="camera horizontal field of view")
+    args = parser.parse_args()
+
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    print("\n=== DETECTION CALIBRATION ===")
+    print(f"{'scale':>6} {'ms/frame':>10} {'recall':>8} {'faces':>6}")
+    for row in calibrate(args.calibrate, cascade, args.scales, args.distance, args.fov):
+        print(f"{row['scale']:>6.2f} {row['ms_per_frame']:>10.1f} {row['recall']:>8.1%} {row['faces']:>6}")
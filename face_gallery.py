@@ -0,0 +1,349 @@
+"""
+Precomputed face gallery for fast matching.
+Every stored face is turned into a histogram once, and all of them are
+packed into one matrix so a probe is scored against everyone at once.
+
+Large galleries can match in two stages: a coarse signature (the histogram
+pooled into a few bins) shortlists the closest photos in one small matrix
+product, and only those are rescored with the full histogram. Compare
+recall and latency against exhaustive search with:
+
+    python face_gallery.py --bench sample_faces/ --size 50000 --shortlist 50 200 --bins 16 32
+
+Features can be kept at reduced precision (float16, or int8 with a scale
+per row) to shrink the matrix 2-4x; rows are widened to float32 in chunks
+while matching.
+"""
+
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+FACE_SIZE = (100, 100)
+HIST_BINS = 256
+FEATURE_PRECISIONS = ("float32", "float16", "int8")
+
+# Rows widened to float32 at a time when features are stored at reduced precision
+CHUNK_ROWS = 16384
+
+
+def face_histogram(face_img):
+    """Normalized 256-bin grayscale histogram of a face crop"""
+    face_img = cv2.resize(face_img, FACE_SIZE)
+    face_norm = cv2.normalize(face_img, None, 0, 255, cv2.NORM_MINMAX)
+    hist = cv2.calcHist([face_norm], [0], None, [HIST_BINS], [0, 256])
+    return hist.ravel()
+
+
+def correlation_features(hists):
+    """
+    Center and scale histograms to unit length, so that a dot product
+    between two rows equals cv2.compareHist(..., cv2.HISTCMP_CORREL).
+    """
+    hists = np.asarray(hists, dtype=np.float32).reshape(-1, HIST_BINS)
+    centered = hists - hists.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centered, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(centered / norms, dtype=np.float32)
+
+
+def coarse_features(features, bins=32):
+    """
+    Pool correlation features into a few bins and rescale to unit length,
+    a cheap stand-in for the full histogram when shortlisting.
+    """
+    features = np.asarray(features, dtype=np.float32).reshape(-1, HIST_BINS)
+    pooled = features.reshape(len(features), bins, HIST_BINS // bins).sum(axis=2)
+    norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(pooled / norms, dtype=np.float32)
+
+
+def quantize_features(features, precision="float32"):
+    """
+    Store correlation features at a precision. Returns (features, scales),
+    where scales holds the per-row int8 scale and is None otherwise.
+    """
+    features = np.asarray(features, dtype=np.float32)
+    if precision == "float32":
+        return features, None
+    if precision == "float16":
+        return features.astype(np.float16), None
+    if precision == "int8":
+        scales = np.abs(features).max(axis=1) / 127.0 if len(features) else np.zeros(0, np.float32)
+        scales[scales == 0] = 1.0
+        return np.round(features / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"Unknown feature precision '{precision}', choose from {', '.join(FEATURE_PRECISIONS)}")
+
+
+class FaceGallery:
+    def __init__(self, known_faces):
+        """Build the feature matrix from {name: [face images]}"""
+        self._build({name: [face_histogram(face) for face in faces]
+                     for name, faces in known_faces.items()})
+
+    @classmethod
+    def from_histograms(cls, user_hists):
+        """Build from already computed histograms, {name: [hist, ...]}"""
+        gallery = cls.__new__(cls)
+        gallery._build(user_hists)
+        return gallery
+
+    @classmethod
+    def from_features(cls, names, offsets, features):
+        """
+        Wrap an existing feature matrix (rows grouped by user, starting at
+        offsets) without copying it, e.g. one memory-mapped from a gallery file.
+        """
+        gallery = cls.__new__(cls)
+        gallery.names = list(names)
+        gallery.offsets = np.asarray(offsets, dtype=np.intp)
+        gallery.features = features
+        gallery.labels = np.repeat(np.arange(len(gallery.names), dtype=np.int32),
+                                   np.diff(np.append(gallery.offsets, len(features))))
+        gallery.index = {name: i for i, name in enumerate(gallery.names)}
+        gallery.scales = None
+        gallery.shortlist = None
+        return gallery
+
+    def _build(self, user_hists):
+        self.names = []
+        offsets = []
+        hists = []
+
+        # Rows are grouped by user, so each user is one contiguous slice
+        for name, user_rows in user_hists.items():
+            if not user_rows:
+                continue
+            self.names.append(name)
+            offsets.append(len(hists))
+            hists.extend(user_rows)
+
+        self.offsets = np.array(offsets, dtype=np.intp)
+        self.features = correlation_features(hists) if hists else np.zeros((0, HIST_BINS), np.float32)
+        self.labels = np.repeat(np.arange(len(self.names), dtype=np.int32), np.diff(np.append(self.offsets, len(hists))))
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.scales = None
+        self.shortlist = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def set_precision(self, precision):
+        """Keep the features as float32, float16 or int8 (see quantize_features)"""
+        if precision == self.precision:
+            return
+        self.features, self.scales = quantize_features(self.feature_rows(slice(None)), precision)
+
+    @property
+    def precision(self):
+        return "int8" if self.scales is not None else self.features.dtype.name
+
+    def feature_rows(self, rows):
+        """Features of some rows (a slice or an index array) as float32"""
+        features = self.features[rows]
+        if features.dtype != np.float32:
+            features = features.astype(np.float32)
+        if self.scales is not None:
+            features *= self.scales[rows][..., None]
+        return features
+
+    def _similarities(self, probes):
+        """(N x M) correlations between every photo and each probe feature"""
+        if self.features.dtype == np.float32:
+            return self.features @ probes.T
+        similarities = np.empty((len(self.features), len(probes)), dtype=np.float32)
+        for start in range(0, len(self.features), CHUNK_ROWS):
+            rows = slice(start, start + CHUNK_ROWS)
+            similarities[rows] = self.feature_rows(rows) @ probes.T
+        return similarities
+
+    def memory_report(self):
+        """Bytes held by the feature matrix and its helpers"""
+        report = {"features": self.features.nbytes, "labels": self.labels.nbytes,
+                  "offsets": self.offsets.nbytes}
+        if self.scales is not None:
+            report["feature_scales"] = self.scales.nbytes
+        if self.shortlist:
+            report["coarse_features"] = self.coarse.nbytes
+        return report
+
+    def use_shortlist(self, k, bins=32, min_photos=None):
+        """
+        Match in two stages: shortlist the k photos closest on a bins-bin
+        coarse signature, then rescore only those with the full histogram.
+        Galleries of at most min_photos photos (by default 10 * k), or k
+        of 0 or None, are still searched exhaustively.
+        """
+        if HIST_BINS % bins:
+            raise ValueError(f"coarse bins must divide {HIST_BINS}, got {bins}")
+        min_photos = 10 * (k or 0) if min_photos is None else min_photos
+        self.shortlist = k if k and len(self.features) > max(min_photos, k) else None
+        self.coarse_bins = bins
+        self.coarse = None
+        if self.shortlist:
+            self.coarse = np.concatenate(
+                [coarse_features(self.feature_rows(slice(start, start + CHUNK_ROWS)), bins)
+                 for start in range(0, len(self.features), CHUNK_ROWS)])
+
+    def _candidates(self, probes):
+        """(k x M) rows of the k photos closest to each probe on the coarse signature"""
+        coarse = self.coarse @ coarse_features(probes, self.coarse_bins).T
+        return np.argpartition(-coarse, self.shortlist - 1, axis=0)[:self.shortlist]
+
+    def probe_feature(self, face_img):
+        """Process a probe face once so it can be scored against everyone"""
+        return correlation_features(face_histogram(face_img))[0]
+
+    def probe_features(self, face_imgs):
+        """Process a batch of probe faces into one (M x 256) matrix"""
+        return correlation_features([face_histogram(face_img) for face_img in face_imgs])
+
+    def match_batch(self, face_imgs):
+        """
+        Best matching user for every face in one batched correlation.
+        Returns [(name, score), ...] in the same order as face_imgs.
+        """
+        if len(face_imgs) == 0:
+            return []
+        if not self.names:
+            return [(None, 0.0)] * len(face_imgs)
+
+        probes = self.probe_features(face_imgs)
+        if self.shortlist:
+            rows = self._candidates(probes)
+            similarities = np.einsum("kmd,md->km", self.feature_rows(rows), probes)
+            best = np.argmax(similarities, axis=0)
+            return [(self.names[self.labels[rows[i, j]]], float(similarities[i, j]))
+                    for j, i in enumerate(best)]
+
+        similarities = self._similarities(probes)
+        scores = np.maximum.reduceat(similarities, self.offsets, axis=0)
+        best = np.argmax(scores, axis=0)
+        return [(self.names[i], float(scores[i, j])) for j, i in enumerate(best)]
+
+    def user_scores(self, probe):
+        """Best correlation per user for an already processed probe"""
+        if not self.names:
+            return np.zeros(0, np.float32)
+
+        similarities = self._similarities(probe[None, :])[:, 0]
+        return np.maximum.reduceat(similarities, self.offsets)
+
+    def score(self, face_img, name):
+        """Best correlation between a face and one user's photos"""
+        i = self.index.get(name)
+        if i is None:
+            return 0.0
+
+        end = self.offsets[i + 1] if i + 1 < len(self.offsets) else len(self.features)
+        similarities = self.feature_rows(slice(self.offsets[i], end)) @ self.probe_feature(face_img)
+        return float(similarities.max())
+
+    def top_k(self, face_img, k=1):
+        """Return the k best matching users as [(name, score), ...]"""
+        probe = self.probe_feature(face_img)
+        if self.shortlist:
+            # Users outside the shortlist score below everyone on it
+            rows = self._candidates(probe[None, :])[:, 0]
+            scores = np.full(len(self.names), -np.inf, dtype=np.float32)
+            np.maximum.at(scores, self.labels[rows], self.feature_rows(rows) @ probe)
+            k = min(k, np.count_nonzero(np.isfinite(scores)))
+        else:
+            scores = self.user_scores(probe)
+        if len(scores) == 0:
+            return []
+
+        k = min(k, len(scores))
+        if k < len(scores):
+            best = np.sort(np.argpartition(-scores, k - 1)[:k])
+        else:
+            best = np.arange(len(scores))
+        # Stable sort keeps the first user on ties, like the old loop did
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(self.names[i], float(scores[i])) for i in best]
+
+
+def face_variant(face, rng, strength):
+    """A randomly shifted, re-exposed and noisy copy of a face crop"""
+    height, width = face.shape
+    dx, dy = rng.integers(0, int(width * 0.08 * strength) + 1, 2)
+    face = cv2.resize(face[dy:, dx:], FACE_SIZE)
+    gamma = np.exp(rng.normal(0.0, 0.2 * strength))
+    lut = np.clip((np.arange(256) / 255.0) ** gamma * 255.0 * rng.uniform(0.9, 1.1), 0, 255)
+    face = cv2.LUT(face, lut.astype(np.uint8))
+    noise = rng.normal(0.0, 3.0 * strength, face.shape)
+    return np.clip(face + noise, 0, 255).astype(np.uint8)
+
+
+def bench(folder, size, users, probes, shortlists, bins_list, seed=0):
+    """
+    Build a synthetic gallery of size photos from the face crops in folder,
+    then time exhaustive and two-stage matching of the same probes. Recall
+    is how often the two-stage match finds the exhaustive best user.
+    """
+    crops = []
+    for filename in sorted(os.listdir(folder)):
+        face = cv2.imread(os.path.join(folder, filename), cv2.IMREAD_GRAYSCALE)
+        if face is not None:
+            crops.append(cv2.resize(face, FACE_SIZE))
+    if not crops:
+        print(f"Error: No face crops found in '{folder}'.")
+        return False
+
+    # Every user is a strongly altered crop; their photos and probes are mild variants of it
+    rng = np.random.default_rng(seed)
+    bases = [face_variant(crops[i % len(crops)], rng, 3.0) for i in range(users)]
+    print(f"Building a gallery of {size} photos of {users} users...")
+    user_hists = {}
+    for i in range(size):
+        user_hists.setdefault(f"user{i % users}", []).append(face_histogram(face_variant(bases[i % users], rng, 1.0)))
+    gallery = FaceGallery.from_histograms(user_hists)
+    probe_faces = [face_variant(bases[u], rng, 1.0) for u in rng.integers(0, users, probes)]
+
+    def run():
+        started = time.perf_counter()
+        names = [gallery.match_batch([face])[0][0] for face in probe_faces]
+        return names, (time.perf_counter() - started) / len(probe_faces) * 1000.0
+
+    gallery.use_shortlist(None)
+    exact, exact_ms = run()
+    print(f"\n{'search':<22}{'ms/probe':>10}{'speedup':>9}{'recall':>8}")
+    print(f"{'exhaustive':<22}{exact_ms:>10.3f}{1.0:>8.1f}x{1.0:>8.3f}")
+    for bins in bins_list:
+        for k in shortlists:
+            gallery.use_shortlist(k, bins, min_photos=0)
+            names, ms = run()
+            recall = np.mean([a == b for a, b in zip(names, exact)])
+            print(f"{f'{bins} bins, top {k}':<22}{ms:>10.3f}{exact_ms / ms:>8.1f}x{recall:>8.3f}")
+    return True
+
+
+def add_gallery_arguments(parser):
+    """Add the gallery matching and storage flags to an argparse parser"""
+    parser.add_argument("--shortlist", type=int, default=200, metavar="K",
+                        help="on large galleries, fully compare only the K photos closest on a "
+                             "coarse signature (0 = compare every photo)")
+    parser.add_argument("--coarse-bins", type=int, default=32, choices=[8, 16, 32, 64, 128],
+                        help="histogram bins of the coarse signature")
+    parser.add_argument("--feature-precision", choices=FEATURE_PRECISIONS, default="float32",
+                        help="store gallery features at reduced precision to save memory")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark two-stage gallery matching")
+    parser.add_argument("--bench", metavar="FOLDER", required=True, help="folder of face crops")
+    parser.add_argument("--size", type=int, default=50000, help="photos in the synthetic gallery")
+    parser.add_argument("--users", type=int, default=5000, help="users in the synthetic gallery")
+    parser.add_argument("--probes", type=int, default=200, help="faces to match")
+    parser.add_argument("--shortlist", type=int, nargs="+", default=[50, 200, 1000],
+                        help="shortlist sizes (K) to try")
+    parser.add_argument("--bins", type=int, nargs="+", default=[16, 32, 64],
+                        help="coarse signature sizes to try")
+    args = parser.parse_args()
+
+    if not bench(args.bench, args.size, args.users, args.probes, args.shortlist, args.bins):
+        raise SystemExit(1)
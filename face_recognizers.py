@@ -0,0 +1,303 @@
+"""
+Interchangeable face recognizers.
+Every backend is trained on {name: [face crops]} and answers match_batch()
+with [(name, score), ...], where a higher score is a better match on the
+same 0-1 scale the histogram matcher uses, so one match threshold works
+for all of them:
+
+    histogram  correlation of grayscale histograms (face_gallery.py)
+    lbph       OpenCV LBPH; can be updated with new photos without retraining
+    eigen      OpenCV Eigenfaces
+    fisher     OpenCV Fisherfaces (needs at least two people)
+
+OpenCV models are saved next to a small JSON file listing the photos they
+were trained on, so a restart loads the model instead of training it, and
+LBPH only learns the photos added since. Compare the backends on a gallery:
+
+    python face_recognizers.py --compare --database "training photos"
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from face_gallery import FACE_SIZE, FaceGallery, face_variant
+
+BACKENDS = ("histogram", "lbph", "eigen", "fisher")
+
+
+class HistogramRecognizer:
+    backend = "histogram"
+    incremental = False
+
+    def __init__(self, gallery=None):
+        """Wrap an existing FaceGallery, or train() one"""
+        self.gallery = gallery if gallery is not None else FaceGallery({})
+
+    def __len__(self):
+        return len(self.gallery)
+
+    def train(self, known_faces):
+        self.gallery = FaceGallery(known_faces)
+
+    def match_batch(self, faces):
+        return self.gallery.match_batch(faces)
+
+    def save(self, path):
+        np.savez(path, names=np.array(self.gallery.names), offsets=self.gallery.offsets,
+                 features=self.gallery.feature_rows(slice(None)))
+
+    def load(self, path):
+        data = np.load(path)
+        self.gallery = FaceGallery.from_features(data["names"].tolist(), data["offsets"], data["features"])
+
+
+class OpenCVRecognizer:
+    """A cv2.face recognizer behind the same interface as HistogramRecognizer"""
+    backend = None
+    factory = None
+    incremental = False
+
+    # Prediction distance that maps to a score of 0; half of it scores 0.5
+    max_distance = 1.0
+
+    def __init__(self, max_distance=None):
+        if max_distance is not None:
+            self.max_distance = max_distance
+        self.names = []
+        self.model = None
+        self.photos = None  # {photo: [name, hash]} it was trained on, see load_or_train
+        self._label_of = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def _create(self):
+        if not hasattr(cv2, "face"):
+            raise RuntimeError("cv2.face is missing; install opencv-contrib-python")
+        return getattr(cv2.face, self.factory)()
+
+    def _samples(self, known_faces):
+        """Resized crops and integer labels, adding new names to the label table"""
+        images, labels = [], []
+        for name, faces in known_faces.items():
+            if name not in self._label_of:
+                self._label_of[name] = len(self.names)
+                self.names.append(name)
+            for face in faces:
+                images.append(cv2.resize(np.asarray(face, dtype=np.uint8), FACE_SIZE))
+                labels.append(self._label_of[name])
+        return images, np.asarray(labels, dtype=np.int32)
+
+    def train(self, known_faces):
+        self.names, self._label_of = [], {}
+        images, labels = self._samples(known_faces)
+        model = self._create()
+        model.train(images, labels)
+        with self._lock:
+            self.model = model
+
+    def update(self, known_faces):
+        """Learn more photos without retraining (LBPH only)"""
+        if not self.incremental:
+            raise NotImplementedError(f"{self.backend} cannot be updated, retrain it")
+        with self._lock:
+            images, labels = self._samples(known_faces)
+            if images:
+                self.model.update(images, labels)
+
+    def match_batch(self, faces):
+        results = []
+        with self._lock:
+            for face in faces:
+                label, distance = self.model.predict(cv2.resize(np.asarray(face, dtype=np.uint8), FACE_SIZE))
+                if label < 0 or label >= len(self.names):
+                    results.append((None, 0.0))
+                    continue
+                results.append((self.names[label], max(0.0, 1.0 - distance / self.max_distance)))
+        return results
+
+    def save(self, path):
+        with self._lock:
+            self.model.write(path)
+
+    def load(self, path, names):
+        model = self._create()
+        model.read(path)
+        self.names = list(names)
+        self._label_of = {name: i for i, name in enumerate(self.names)}
+        with self._lock:
+            self.model = model
+
+
+class LBPHRecognizer(OpenCVRecognizer):
+    backend = "lbph"
+    factory = "LBPHFaceRecognizer_create"
+    incremental = True
+    max_distance = 160.0
+
+
+class EigenRecognizer(OpenCVRecognizer):
+    backend = "eigen"
+    factory = "EigenFaceRecognizer_create"
+    max_distance = 10000.0
+
+
+class FisherRecognizer(OpenCVRecognizer):
+    backend = "fisher"
+    factory = "FisherFaceRecognizer_create"
+    max_distance = 2000.0
+
+
+RECOGNIZERS = {cls.backend: cls for cls in
+               (HistogramRecognizer, LBPHRecognizer, EigenRecognizer, FisherRecognizer)}
+
+
+def create_recognizer(backend, max_distance=None):
+    """New untrained recognizer for a backend name"""
+    if backend not in RECOGNIZERS:
+        raise ValueError(f"Unknown recognizer '{backend}', choose from {', '.join(BACKENDS)}")
+    if max_distance is None:
+        return RECOGNIZERS[backend]()
+    return RECOGNIZERS[backend](max_distance)
+
+
+def _group(photos, keys, face_of):
+    known_faces = {}
+    for key in keys:
+        known_faces.setdefault(photos[key][0], []).append(face_of(key))
+    return known_faces
+
+
+def load_or_train(backend, path, photos, face_of, max_distance=None, previous=None):
+    """
+    OpenCV recognizer for a set of photos, reusing earlier training.
+    photos is {photo: (name, content hash)} and face_of(photo) returns its
+    crop. previous is the recognizer in use (e.g. before a hot reload);
+    otherwise the model saved at path is read. That model is kept if it was
+    trained on exactly these photos, and LBPH is updated in place if photos
+    were only added; anything else is trained from scratch. The result is
+    saved to path. Returns (recognizer, "loaded", "updated" or "trained").
+    """
+    current = {key: list(value) for key, value in photos.items()}
+    manifest_path = path + ".json"
+    recognizer, kept = None, None
+    if previous is not None and previous.backend == backend and previous.photos is not None:
+        recognizer, kept = previous, previous.photos
+    else:
+        try:
+            with open(manifest_path) as f:
+                saved = json.load(f)
+            if saved.get("backend") == backend and os.path.exists(path):
+                recognizer = create_recognizer(backend, max_distance)
+                recognizer.load(path, saved["names"])
+                kept = saved["photos"]
+        except (OSError, ValueError, KeyError, cv2.error) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Warning: Could not reuse {backend} model '{path}': {e}")
+            recognizer = None
+
+    if recognizer is not None and kept == current:
+        return recognizer, "loaded"
+    if (recognizer is not None and recognizer.incremental
+            and all(current.get(key) == value for key, value in kept.items())):
+        recognizer.update(_group(photos, [key for key in photos if key not in kept], face_of))
+        how = "updated"
+    else:
+        recognizer = create_recognizer(backend, max_distance)
+        recognizer.train(_group(photos, list(photos), face_of))
+        how = "trained"
+    recognizer.photos = current
+
+    try:
+        recognizer.save(path)
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"backend": backend, "names": recognizer.names, "photos": current}, f)
+        os.replace(tmp_path, manifest_path)
+    except (OSError, cv2.error) as e:
+        print(f"Warning: Could not save {backend} model '{path}': {e}")
+    return recognizer, how
+
+
+def _rss_bytes():
+    """Resident memory of this process, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def compare(known_faces, backends=BACKENDS, probes_per_face=3, seed=0, model_dir="."):
+    """
+    Train every backend on the same faces and measure it. Probes are
+    shifted, re-exposed and noisy copies of the gallery photos, so accuracy
+    is how often a backend still names the right person.
+    """
+    rng = np.random.default_rng(seed)
+    probes, truth = [], []
+    for name, faces in known_faces.items():
+        for face in faces:
+            for _ in range(probes_per_face):
+                probes.append(face_variant(cv2.resize(np.asarray(face, dtype=np.uint8), FACE_SIZE), rng, 1.0))
+                truth.append(name)
+
+    rows = []
+    for backend in backends:
+        recognizer = create_recognizer(backend)
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        try:
+            recognizer.train(known_faces)
+        except (cv2.error, RuntimeError) as e:
+            print(f"Warning: {backend} could not be trained: {e}")
+            continue
+        train_s = time.perf_counter() - started
+        rss_after = _rss_bytes()
+
+        started = time.perf_counter()
+        matches = [recognizer.match_batch([probe])[0] for probe in probes]
+        predict_ms = (time.perf_counter() - started) / max(len(probes), 1) * 1000.0
+
+        path = os.path.join(model_dir, f"compare_{backend}" + (".npz" if backend == "histogram" else ".yml"))
+        recognizer.save(path)
+        model_bytes = os.path.getsize(path)
+        os.remove(path)
+
+        rows.append({"backend": backend, "train_s": round(train_s, 3), "predict_ms": round(predict_ms, 3),
+                     "model_kb": round(model_bytes / 1024, 1),
+                     "rss_mb": round((rss_after - rss_before) / 1e6, 1) if rss_before is not None else None,
+                     "accuracy": round(float(np.mean([name == want for (name, _), want in zip(matches, truth)])), 3)})
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the face recognizer backends")
+    parser.add_argument("--compare", action="store_true",
+                        help="train and time every backend on the same gallery")
+    parser.add_argument("--database", default="training photos", help="photo folder or gallery file")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--probes", type=int, default=3, help="altered probes per gallery photo")
+    args = parser.parse_args()
+    if not args.compare:
+        parser.print_help()
+        raise SystemExit(0)
+
+    from security_system_database import SimpleFaceIDSystem
+    app = SimpleFaceIDSystem(headless=True)
+    app.database_folder = args.database
+    if not app.load_database():
+        raise SystemExit(1)
+
+    print(f"\n{'backend':<11}{'train s':>9}{'predict ms':>12}{'model KB':>10}{'RSS MB':>8}{'accuracy':>10}")
+    for row in compare(app.known_faces, args.backends, args.probes):
+        rss = "-" if row["rss_mb"] is None else f"{row['rss_mb']:.1f}"
+        print(f"{row['backend']:<11}{row['train_s']:>9.3f}{row['predict_ms']:>12.3f}"
+              f"{row['model_kb']:>10.1f}{rss:>8}{row['accuracy']:>10.3f}")
@@ -0,0 +1,182 @@
+"""
+Compact in-memory store of the loaded face database.
+Every face crop lives in one contiguous (N x 100 x 100) uint8 array and
+every raw histogram in one (N x 256) uint16 array, with rows grouped by
+user. People are small __slots__ records pointing at their rows, and each
+row has an int32 user index, so 100k photos cost a handful of arrays
+instead of 100k separate ndarrays plus dicts of lists. People are keyed
+by ID (see user_registry.user_key), never by display name.
+
+A cap on templates per user keeps memory bounded; photos over the cap are
+evicted by policy:
+
+    oldest      drop the oldest photos, keep the newest
+    redundant   repeatedly drop one of the two most similar photos,
+                keeping the most varied templates
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+from face_gallery import FACE_SIZE, HIST_BINS, correlation_features
+from user_registry import user_key
+
+EVICTION_POLICIES = ("oldest", "redundant")
+
+
+class UserRecord:
+    """One person: display name, ID and the rows holding their faces"""
+    __slots__ = ("name", "user_id", "start", "count")
+
+    def __init__(self, name, user_id, start, count):
+        self.name = name
+        self.user_id = user_id
+        self.start = start
+        self.count = count
+
+    @property
+    def key(self):
+        return user_key(self.name, self.user_id)
+
+    @property
+    def rows(self):
+        return slice(self.start, self.start + self.count)
+
+
+def select_templates(hists, added, cap, policy="oldest"):
+    """
+    Indices of the photos of one user to keep under a cap, in their
+    original order. hists are the photos' histograms and added their ages
+    (larger is newer). cap is None (keep all) or at least 1.
+    """
+    if cap is not None and cap < 1:
+        raise ValueError(f"Template cap must be at least 1, not {cap}")
+    count = len(hists)
+    if cap is None or count <= cap:
+        return list(range(count))
+    if policy == "oldest":
+        newest = sorted(range(count), key=lambda i: added[i])[count - cap:]
+        return sorted(newest)
+    if policy != "redundant":
+        raise ValueError(f"Unknown eviction policy '{policy}', choose from {', '.join(EVICTION_POLICIES)}")
+
+    features = correlation_features(hists)
+    similarities = features @ features.T
+    np.fill_diagonal(similarities, -np.inf)
+    kept = list(range(count))
+    while len(kept) > cap:
+        pair = similarities[np.ix_(kept, kept)]
+        i, j = np.unravel_index(np.argmax(pair), pair.shape)
+        # Of the two closest photos, the older one goes
+        kept.pop(i if added[kept[i]] <= added[kept[j]] else j)
+    return kept
+
+
+class FaceStore:
+    def __init__(self, users, faces, hists=None, keys=None, evicted=()):
+        """
+        Wrap arrays whose rows are grouped by user, e.g. ones memory-mapped
+        from a gallery file. keys names the photo of each row.
+        """
+        self.users = users
+        self.faces = faces
+        self.hists = hists
+        self.keys = list(keys) if keys is not None else [None] * len(faces)
+        self.evicted = list(evicted)
+        self.labels = np.repeat(np.arange(len(users), dtype=np.int32),
+                                [user.count for user in users])
+        self.index = {user.key: i for i, user in enumerate(users)}
+
+    @classmethod
+    def build(cls, photos, max_per_user=None, eviction="oldest"):
+        """
+        Pack photos, [(key, name, user_id, face, hist, added), ...], into
+        one array per component. Users keep the order they first appear in,
+        and one ID filed under several names keeps the first name.
+        At most max_per_user photos are kept per user, chosen by eviction.
+        """
+        by_user = {}
+        for photo in photos:
+            by_user.setdefault(user_key(photo[1], photo[2]), []).append(photo)
+
+        selected, evicted = [], []
+        for user_photos in by_user.values():
+            keep = select_templates([photo[4] for photo in user_photos],
+                                    [photo[5] for photo in user_photos], max_per_user, eviction)
+            selected.append([user_photos[i] for i in keep])
+            kept = set(keep)
+            evicted.extend(photo[0] for i, photo in enumerate(user_photos) if i not in kept)
+
+        total = sum(len(user_photos) for user_photos in selected)
+        faces = np.empty((total, FACE_SIZE[1], FACE_SIZE[0]), dtype=np.uint8)
+        hists = np.empty((total, HIST_BINS), dtype=np.uint16)
+        users, keys = [], []
+        row = 0
+        for user_photos in selected:
+            users.append(UserRecord(user_photos[0][1], user_photos[0][2], row, len(user_photos)))
+            for key, _, _, face, hist, _ in user_photos:
+                faces[row] = face
+                hists[row] = hist
+                keys.append(key)
+                row += 1
+        return cls(users, faces, hists, keys, evicted)
+
+    def __len__(self):
+        return len(self.users)
+
+    @property
+    def user_keys(self):
+        return [user.key for user in self.users]
+
+    @property
+    def offsets(self):
+        return np.array([user.start for user in self.users], dtype=np.intp)
+
+    def known_faces(self):
+        """{user key: (count x 100 x 100) view of that user's faces}"""
+        return {user.key: self.faces[user.rows] for user in self.users}
+
+    def user_ids(self):
+        """{user key: ID}"""
+        return {user.key: user.user_id for user in self.users}
+
+    def display_names(self):
+        """{user key: name shown on screen}"""
+        return {user.key: user.name for user in self.users}
+
+    def memory_report(self):
+        """Bytes held by each component"""
+        report = {
+            # Crops mapped from a gallery file live in the page cache, shared
+            "faces_mapped" if isinstance(self.faces, np.memmap) else "faces": self.faces.nbytes,
+            "labels": self.labels.nbytes,
+            "users": sys.getsizeof(self.users) + sum(
+                sys.getsizeof(user) + sys.getsizeof(user.name) + sys.getsizeof(user.user_id)
+                for user in self.users),
+            "user_index": sys.getsizeof(self.index),
+            "photo_keys": sys.getsizeof(self.keys) + sum(sys.getsizeof(key) for key in self.keys),
+        }
+        if self.hists is not None:
+            report["histograms"] = self.hists.nbytes
+        return report
+
+
+def template_cap(value):
+    """argparse type for --max-templates: a whole number of at least 1"""
+    try:
+        cap = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a whole number")
+    if cap < 1:
+        raise argparse.ArgumentTypeError("must keep at least 1 photo per user")
+    return cap
+
+
+def add_store_arguments(parser):
+    """Add the template cap flags to an argparse parser"""
+    parser.add_argument("--max-templates", type=template_cap, metavar="N",
+                        help="keep at most N photos per user, evicting the rest")
+    parser.add_argument("--eviction", choices=EVICTION_POLICIES, default="oldest",
+                        help="which photos go over --max-templates: the oldest, or the most redundant")
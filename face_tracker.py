@@ -0,0 +1,269 @@
+"""
+Lightweight face tracker.
+Associates face boxes across frames by IoU, falling back to centroid
+distance, so each person keeps a stable track ID. Tracks collect identity
+votes, which lets recognition be skipped for people already known, and
+between full-frame detections the detector only searches a small region
+around each track. An OpenCV tracker can optionally carry a box through
+frames where the detector misses the face.
+
+Detection updates the tracks on its own thread while recognition votes
+and the display looks tracks up, so the track table and each track's
+votes are guarded by locks.
+"""
+
+import itertools
+import threading
+from collections import deque
+
+import cv2
+
+from face_detection import box_iou, clip_box
+
+
+class TrackedFace(tuple):
+    """An (x, y, w, h) box that also knows which track it belongs to"""
+
+    def __new__(cls, box, track):
+        face = super().__new__(cls, (int(v) for v in box[:4]))
+        face.track = track
+        return face
+
+
+class Track:
+    def __init__(self, track_id, box, frame_id, vote_window=5):
+        self.track_id = track_id
+        self.box = tuple(int(v) for v in box)
+        self.first_seen = frame_id
+        self.last_seen = frame_id
+
+        # Identity waiting for an ID check, and the outcome shown on screen
+        self.pending_name = None
+        self.status = None
+        self.status_frame = 0
+
+        # Scheduler times (see frame_scheduler.py): last recognition, and
+        # when a face held after a match or denial may be recognized again
+        self.recognized_at = None
+        self.hold_until = 0.0
+
+        # The last few recognition results as (name or None, score)
+        self.votes = deque(maxlen=vote_window)
+        self.last_recognized = None
+        self._votes_lock = threading.Lock()
+
+        self.cv_tracker = None
+
+    @property
+    def center(self):
+        x, y, w, h = self.box
+        return (x + w / 2.0, y + h / 2.0)
+
+    @property
+    def vote_count(self):
+        return len(self.votes)
+
+    def add_vote(self, name, score, frame_id):
+        """Record one recognition result for this track"""
+        with self._votes_lock:
+            self.votes.append((name, float(score)))
+            self.last_recognized = frame_id
+
+    def identity(self):
+        """(name, confidence, mean score) of the leading vote, or (None, 0.0, 0.0)"""
+        with self._votes_lock:
+            votes = list(self.votes)
+        if not votes:
+            return None, 0.0, 0.0
+        counts, scores = {}, {}
+        for name, score in votes:
+            counts[name] = counts.get(name, 0) + 1
+            scores[name] = scores.get(name, 0.0) + score
+        name = max(counts, key=lambda n: (counts[n], scores[n]))
+        return name, counts[name] / len(votes), scores[name] / counts[name]
+
+    def reset_votes(self):
+        with self._votes_lock:
+            self.votes.clear()
+            self.last_recognized = None
+            self.recognized_at = None
+
+
+def _create_cv_tracker():
+    """A KCF tracker from whichever OpenCV API is installed, or None"""
+    for factory in (getattr(cv2, "TrackerKCF_create", None),
+                    getattr(getattr(cv2, "legacy", None), "TrackerKCF_create", None)):
+        if factory is not None:
+            return factory()
+    return None
+
+
+class FaceTracker:
+    def __init__(self, max_distance=0.75, max_missed=15, min_iou=0.3,
+                 min_votes=2, min_confidence=0.6, stale_frames=150,
+                 full_detect_every=1, roi_margin=0.5, use_cv_tracker=False, vote_window=5):
+        """
+        max_distance is how far a face may move between detections,
+        relative to its width, when boxes no longer overlap by min_iou.
+        Tracks not seen for max_missed frames are dropped.
+
+        A track is recognized again until min_votes of its last vote_window
+        results agree at least min_confidence, and after that every
+        stale_frames.
+
+        detect() scans the whole frame every full_detect_every detection
+        rounds and only the area around each track (grown by roi_margin)
+        in between. use_cv_tracker keeps boxes moving with an OpenCV KCF
+        tracker when the detector misses a face inside its region.
+        """
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.min_iou = min_iou
+        self.min_votes = min_votes
+        self.min_confidence = min_confidence
+        self.stale_frames = stale_frames
+        self.vote_window = vote_window
+        self.full_detect_every = full_detect_every
+        self.roi_margin = roi_margin
+        self.use_cv_tracker = use_cv_tracker and _create_cv_tracker() is not None
+
+        self.tracks = {}
+        self.lost = []  # tracks dropped by the last update
+        self.stats = {"full_detections": 0, "roi_detections": 0,
+                      "recognitions_run": 0, "recognitions_reused": 0}
+        self._ids = itertools.count(1)
+        self._rounds_since_full = None
+        self._last_update = None
+        self._lock = threading.Lock()
+
+    def _distance(self, track, box):
+        x, y, w, h = box[:4]
+        cx, cy = track.center
+        return ((cx - (x + w / 2.0)) ** 2 + (cy - (y + h / 2.0)) ** 2) ** 0.5 / max(track.box[2], 1)
+
+    def active_tracks(self):
+        """Snapshot of the current tracks, safe to use while detection updates them"""
+        with self._lock:
+            return list(self.tracks.values())
+
+    def update(self, faces, frame_id, frame=None):
+        """
+        Match detections to tracks. Returns a TrackedFace for each face, in order.
+        Pass the frame to (re)start OpenCV trackers on the matched boxes.
+        """
+        with self._lock:
+            # Greedy matching: best overlap first, then nearest centers
+            pairs = []
+            for i, box in enumerate(faces):
+                for track in self.tracks.values():
+                    iou = box_iou(track.box, box)
+                    distance = self._distance(track, box)
+                    if iou >= self.min_iou or distance <= self.max_distance:
+                        pairs.append((-iou, distance, i, track.track_id))
+            pairs.sort()
+
+            assigned = [None] * len(faces)
+            used = set()
+            for _, _, i, track_id in pairs:
+                if assigned[i] is not None or track_id in used:
+                    continue
+                track = self.tracks[track_id]
+                track.box = tuple(int(v) for v in faces[i][:4])
+                track.last_seen = frame_id
+                assigned[i] = track
+                used.add(track_id)
+
+            for i, box in enumerate(faces):
+                if assigned[i] is None:
+                    track = Track(next(self._ids), box[:4], frame_id, self.vote_window)
+                    self.tracks[track.track_id] = track
+                    assigned[i] = track
+
+            self._last_update = frame_id
+            self.lost = [track for track in self.tracks.values()
+                         if frame_id - track.last_seen > self.max_missed]
+            for track in self.lost:
+                del self.tracks[track.track_id]
+
+        if self.use_cv_tracker and frame is not None:
+            for track in assigned:
+                track.cv_tracker = _create_cv_tracker()
+                track.cv_tracker.init(frame, track.box)
+
+        return [TrackedFace(box, track) for box, track in zip(faces, assigned)]
+
+    def tracked_faces(self):
+        """Faces found by the last update, for frames where detection is skipped"""
+        with self._lock:
+            return [TrackedFace(track.box, track) for track in self.tracks.values()
+                    if track.last_seen == self._last_update]
+
+    def _region(self, track, width, height):
+        x, y, w, h = track.box
+        pad_w, pad_h = int(w * self.roi_margin), int(h * self.roi_margin)
+        x0, y0 = max(x - pad_w, 0), max(y - pad_h, 0)
+        x1, y1 = min(x + w + pad_w, width), min(y + h + pad_h, height)
+        return x0, y0, x1, y1
+
+    def detect(self, frame_id, frame, gray, detect_fn):
+        """
+        Detect faces for a frame and update the tracks.
+        detect_fn(gray, frame_width) returns (x, y, w, h) boxes.
+        Returns a TrackedFace per face.
+        """
+        full = (not self.tracks or self._rounds_since_full is None
+                or self._rounds_since_full + 1 >= self.full_detect_every)
+        if full:
+            self._rounds_since_full = 0
+            self.stats["full_detections"] += 1
+            return self.update(list(detect_fn(gray, gray.shape[1])), frame_id, frame)
+
+        self._rounds_since_full += 1
+        self.stats["roi_detections"] += 1
+        height, width = gray.shape[:2]
+        faces = []
+        for track in self.active_tracks():
+            x0, y0, x1, y1 = self._region(track, width, height)
+            found = [(x + x0, y + y0, w, h) for (x, y, w, h) in detect_fn(gray[y0:y1, x0:x1], width)]
+
+            # Let the OpenCV tracker carry the box when the detector misses it.
+            # Its boxes can leave the frame, so keep only the part inside.
+            if not found and track.cv_tracker is not None:
+                ok, box = track.cv_tracker.update(frame)
+                box = clip_box(box, width, height) if ok else None
+                if box is not None:
+                    found = [box]
+
+            for box in found:
+                if all(box_iou(box, other) < 0.5 for other in faces):
+                    faces.append(box)
+
+        return self.update(faces, frame_id, frame)
+
+    def needs_recognition(self, track, frame_id):
+        """New, uncertain or stale tracks are recognized; the rest reuse their identity"""
+        if track.vote_count < self.min_votes or track.last_recognized is None:
+            return True
+        if track.identity()[1] < self.min_confidence:
+            return True
+        return frame_id - track.last_recognized > self.stale_frames
+
+    def summary(self, seconds=None):
+        """Tracker counters, plus recognitions saved per second over a run"""
+        summary = dict(self.stats, active_tracks=len(self.tracks))
+        if seconds:
+            summary["recognitions_saved_per_sec"] = round(self.stats["recognitions_reused"] / seconds, 2)
+        return summary
+
+
+def add_tracker_arguments(parser):
+    """Add the face tracker flags to an argparse parser"""
+    parser.add_argument("--full-detect-every", type=int, default=1, metavar="N",
+                        help="scan the whole frame every N detections, only around known faces in between")
+    parser.add_argument("--cv-tracker", action="store_true",
+                        help="follow faces with an OpenCV tracker when detection misses them")
+
+
+def tracker_from_args(args):
+    """FaceTracker from the add_tracker_arguments flags"""
+    return FaceTracker(full_detect_every=args.full_detect_every, use_cv_tracker=args.cv_tracker)
@@ -0,0 +1,219 @@
+"""
+Per-frame scheduling of detection and recognition.
+Instead of a fixed cooldown or processing every other frame, work is paid
+for out of a CPU budget: a token bucket that fills at cpu_budget seconds of
+processing per second and is drained by the measured cost of every
+detection and recognition. So the same settings hold at any camera frame
+rate, on any machine and with any number of faces in view.
+
+On top of the budget:
+- once no face has been seen for idle_after seconds the scene is idle, and
+  detection only runs when the motion gate sees movement (see
+  motion_gate.py), plus every safety_interval seconds in case it missed
+  someone; without the gate an idle scene is detected every idle_interval
+  seconds;
+- a face without an identity yet is recognized every decision_time / votes
+  seconds even when the budget is spent, so it gets a decision within about
+  decision_time; only re-checks of known faces wait for budget, and they
+  go ahead of detection;
+- after a match or a denied ID check a face is held for retry_delay seconds
+  before it is recognized again.
+
+Settings can be passed to FrameScheduler, read from a JSON file with
+--scheduler-config, or given as flags (see add_scheduler_arguments).
+"""
+
+import json
+import threading
+import time
+
+from motion_gate import MotionGate
+
+SCHEDULER_SETTINGS = ("cpu_budget", "decision_time", "votes", "idle_interval",
+                      "idle_after", "retry_delay", "burst", "motion_gate", "safety_interval")
+
+
+class FrameScheduler:
+    def __init__(self, cpu_budget=0.5, decision_time=0.5, votes=2, idle_interval=0.5,
+                 idle_after=2.0, retry_delay=1.0, burst=0.5, motion_gate=True,
+                 safety_interval=5.0, clock=time.monotonic):
+        """
+        cpu_budget is the share of one core detection and recognition may
+        use on average; burst is how many seconds of work may be done in a
+        row before the budget applies. motion_gate turns on the motion
+        check for idle scenes. clock returns the current time in seconds
+        (replays pass one based on the video's frame rate).
+        """
+        self.cpu_budget = cpu_budget
+        self.decision_time = decision_time
+        self.votes = votes
+        self.idle_interval = idle_interval
+        self.idle_after = idle_after
+        self.retry_delay = retry_delay
+        self.burst = burst
+        self.motion_gate = motion_gate
+        self.safety_interval = safety_interval
+        self.clock = clock
+        self.gate = MotionGate() if motion_gate else None
+
+        self.last_detection = None
+        self.last_face_seen = None
+        self.stats = {"detections_run": 0, "detections_skipped": 0, "idle_detections": 0,
+                      "motion_skipped": 0, "safety_detections": 0,
+                      "recognitions_run": 0, "recognitions_deferred": 0}
+        self._tokens = burst
+        self._refilled_at = None
+        self._lock = threading.Lock()
+
+    def settings(self):
+        """Constructor settings, e.g. to make a scheduler per camera"""
+        return {name: getattr(self, name) for name in SCHEDULER_SETTINGS}
+
+    def _refill(self, now):
+        if self._refilled_at is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.cpu_budget)
+        self._refilled_at = now
+
+    def _spend(self, seconds, now):
+        with self._lock:
+            self._refill(now)
+            self._tokens -= seconds
+
+    def idle(self, now):
+        """True once no face has been seen for idle_after seconds"""
+        return self.last_face_seen is None or now - self.last_face_seen >= self.idle_after
+
+    def should_detect(self, now=None, image=None):
+        """
+        Whether to run face detection on this frame. Pass the frame (or a
+        downscaled copy) as image so the motion gate can check idle scenes.
+        """
+        now = self.clock() if now is None else now
+        idle = self.idle(now)
+        if idle and not self._idle_check(now, image):
+            self.stats["detections_skipped"] += 1
+            return False
+
+        with self._lock:
+            self._refill(now)
+            run = self._tokens > 0
+        if not run:
+            self.stats["detections_skipped"] += 1
+            return False
+
+        self.last_detection = now
+        self.stats["detections_run"] += 1
+        self.stats["idle_detections"] += idle
+        return True
+
+    def _idle_check(self, now, image):
+        """Whether an idle scene should be detected on this frame"""
+        since = None if self.last_detection is None else now - self.last_detection
+        if self.gate is None or image is None:
+            return since is None or since >= self.idle_interval
+        if self.gate.moved(image):
+            return True
+        if since is None or since >= self.safety_interval:
+            self.stats["safety_detections"] += 1
+            return True
+        self.stats["motion_skipped"] += 1
+        return False
+
+    def detected(self, face_count, seconds, now=None):
+        """Record a detection that took seconds and found face_count faces"""
+        now = self.clock() if now is None else now
+        self._spend(seconds, now)
+        if face_count:
+            self.last_face_seen = now
+            # Compare against a fresh background once the scene is empty again
+            if self.gate is not None:
+                self.gate.reset()
+
+    def held(self, track, now=None):
+        """Whether a face is waiting out retry_delay after a match or denial"""
+        now = self.clock() if now is None else now
+        return now < track.hold_until
+
+    def hold(self, track, now=None):
+        """Hold a face for retry_delay seconds"""
+        now = self.clock() if now is None else now
+        track.hold_until = now + self.retry_delay
+
+    def due(self, track, now=None):
+        """
+        Whether a face that still needs an identity should be recognized
+        now. Faces short of votes only wait their turn, so they are decided
+        within decision_time. Re-checks of known faces also need budget, but
+        may borrow up to burst seconds so detection cannot starve them.
+        """
+        now = self.clock() if now is None else now
+        if track.recognized_at is None:
+            return True
+        if now - track.recognized_at < self.decision_time / max(self.votes, 1):
+            return False
+        if track.vote_count < self.votes:
+            return True
+        with self._lock:
+            self._refill(now)
+            run = self._tokens > -self.burst
+        if not run:
+            self.stats["recognitions_deferred"] += 1
+        return run
+
+    def recognized(self, tracks, seconds, now=None):
+        """Record that tracks were recognized in one pass taking seconds"""
+        now = self.clock() if now is None else now
+        if not tracks:
+            return
+        self._spend(seconds, now)
+        for track in tracks:
+            track.recognized_at = now
+        self.stats["recognitions_run"] += len(tracks)
+
+    def summary(self):
+        """Scheduler counters and how full the budget is"""
+        with self._lock:
+            tokens = self._tokens
+        return dict(self.stats, budget_left_s=round(tokens, 3))
+
+
+def load_scheduler_config(path):
+    """Scheduler settings from a JSON file, e.g. {"cpu_budget": 0.3}"""
+    with open(path) as f:
+        config = json.load(f)
+    unknown = set(config) - set(SCHEDULER_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown scheduler settings in '{path}': {', '.join(sorted(unknown))}")
+    return config
+
+
+def add_scheduler_arguments(parser):
+    """Add the scheduler flags to an argparse parser"""
+    parser.add_argument("--scheduler-config", metavar="FILE",
+                        help="JSON file of frame scheduler settings (see frame_scheduler.py)")
+    parser.add_argument("--cpu-budget", type=float,
+                        help="share of one core detection and recognition may use (default 0.5)")
+    parser.add_argument("--decision-time", type=float,
+                        help="seconds to settle a new face's identity (default 0.5)")
+    parser.add_argument("--idle-interval", type=float,
+                        help="seconds between detections while nobody is in view, without the "
+                             "motion gate (default 0.5)")
+    parser.add_argument("--no-motion-gate", dest="motion_gate", action="store_false", default=None,
+                        help="detect idle scenes every idle interval instead of on motion")
+    parser.add_argument("--safety-interval", type=float,
+                        help="seconds between detections of a static idle scene (default 5)")
+
+
+def scheduler_from_args(args, **defaults):
+    """FrameScheduler from a config file and flags; flags win over the file"""
+    settings = dict(defaults)
+    if args.scheduler_config:
+        try:
+            settings.update(load_scheduler_config(args.scheduler_config))
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read scheduler config: {e}")
+            raise SystemExit(1)
+    for name in ("cpu_budget", "decision_time", "idle_interval", "motion_gate", "safety_interval"):
+        if getattr(args, name) is not None:
+            settings[name] = getattr(args, name)
+    return FrameScheduler(**settings)
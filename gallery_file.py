@@ -0,0 +1,118 @@
+"""
+Single-file gallery for fast startup.
+A build step packs every face crop and its matching features into one
+binary file: a small JSON header (names, IDs, per-user offsets, source
+photo hashes) followed by aligned raw arrays. At runtime the arrays are
+opened with np.memmap, so nothing is decoded or copied at startup and
+processes that open the same file share its pages through the OS cache.
+
+    python security_system_database.py --build-gallery gallery.bin
+    python security_system_database.py --database gallery.bin
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from face_gallery import FACE_SIZE, HIST_BINS, correlation_features
+from user_registry import user_key
+
+MAGIC = b"FACEGAL1"
+GALLERY_VERSION = 1
+
+# Arrays start on cache-line boundaries
+ALIGN = 64
+
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_gallery_file(path, records):
+    """
+    Write records to a gallery file. Each record is a dict with name,
+    user_id, face (100x100 uint8), hist, source and hash. Rows are grouped
+    by user ID in order of first appearance. Returns the number of faces written.
+    """
+    users = {}
+    for record in records:
+        users.setdefault(user_key(record["name"], record["user_id"]), []).append(record)
+
+    names, user_ids, offsets, sources, faces, hists = [], [], [], [], [], []
+    for user_records in users.values():
+        names.append(user_records[0]["name"])
+        user_ids.append(user_records[0]["user_id"])
+        offsets.append(len(faces))
+        for record in user_records:
+            sources.append({"file": record["source"], "hash": record["hash"]})
+            faces.append(record["face"])
+            hists.append(record["hist"])
+
+    arrays = {
+        "faces": np.asarray(faces, dtype=np.uint8).reshape(-1, FACE_SIZE[1], FACE_SIZE[0]),
+        "features": correlation_features(hists) if hists else np.zeros((0, HIST_BINS), np.float32),
+        "offsets": np.asarray(offsets, dtype=np.int64),
+    }
+
+    # Array offsets are relative to the aligned end of the header
+    header = {"version": GALLERY_VERSION, "names": names, "user_ids": user_ids,
+              "sources": sources, "arrays": {}}
+    position = 0
+    for key, array in arrays.items():
+        header["arrays"][key] = {"offset": position, "dtype": array.dtype.str, "shape": list(array.shape)}
+        position = _aligned(position + array.nbytes)
+    header_bytes = json.dumps(header).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(header_bytes))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for key, array in arrays.items():
+            f.seek(data_start + header["arrays"][key]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + position)
+    os.replace(tmp_path, path)
+    return len(faces)
+
+
+class GalleryFile:
+    def __init__(self, path):
+        """Open a gallery file. Face crops and features are memory-mapped, read-only."""
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"'{path}' is not a gallery file")
+            (header_len,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_len))
+        self._data_start = _aligned(len(MAGIC) + 8 + header_len)
+
+        if header.get("version") != GALLERY_VERSION:
+            raise ValueError(f"'{path}' has gallery version {header.get('version')}, "
+                             f"expected {GALLERY_VERSION}; rebuild it")
+
+        self.names = header["names"]
+        self.user_ids = header["user_ids"]
+        self.sources = header["sources"]
+        arrays = {key: self._map(spec) for key, spec in header["arrays"].items()}
+        self.faces = arrays["faces"]
+        self.features = arrays["features"]
+        self.offsets = np.asarray(arrays["offsets"], dtype=np.intp)
+
+    def _map(self, spec):
+        shape = tuple(spec["shape"])
+        if 0 in shape:
+            return np.zeros(shape, dtype=spec["dtype"])
+        return np.memmap(self.path, dtype=spec["dtype"], mode="r",
+                         offset=self._data_start + spec["offset"], shape=shape)
+
+    def __len__(self):
+        return len(self.names)
+
+    def user_rows(self, i):
+        """Row slice of user i"""
+        end = self.offsets[i + 1] if i + 1 < len(self.offsets) else len(self.features)
+        return slice(int(self.offsets[i]), int(end))
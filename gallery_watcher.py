@@ -0,0 +1,67 @@
+"""
+Polls the training photos folder for added, changed and removed photos.
+Each poll is one os.scandir pass comparing sizes and mtimes, so the cost
+of noticing a change does not involve reading any image.
+"""
+
+import os
+import threading
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def scan_folder(folder):
+    """{path: (size, mtime_ns)} for every photo in a folder"""
+    snapshot = {}
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith(IMAGE_EXTENSIONS) or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+    except OSError as e:
+        print(f"Warning: Could not scan '{folder}': {e}")
+    return snapshot
+
+
+def diff_snapshots(old, new):
+    """Return (changed, removed) paths between two scans; changed includes added"""
+    changed = [path for path, state in new.items() if old.get(path) != state]
+    removed = [path for path in old if path not in new]
+    return changed, removed
+
+
+class GalleryWatcher:
+    def __init__(self, folder, on_change, interval=2.0):
+        """on_change(changed_paths, removed_paths) is called from the watcher thread"""
+        self.folder = folder
+        self.on_change = on_change
+        self.interval = interval
+        self.snapshot = scan_folder(folder)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="gallery-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+    def poll(self):
+        """Check the folder once and report any changes"""
+        snapshot = scan_folder(self.folder)
+        changed, removed = diff_snapshots(self.snapshot, snapshot)
+        self.snapshot = snapshot
+        if changed or removed:
+            self.on_change(changed, removed)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Error reloading database: {e}")
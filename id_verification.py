@@ -0,0 +1,129 @@
+"""
+Non-blocking ID verification.
+Matched faces are queued for an ID check that is typed into a non-modal
+window, while the camera loop keeps running and pumps Tk events.
+ScriptedVerifier answers the same requests without a display, for replays.
+"""
+
+from collections import deque
+
+
+class VerificationRequest:
+    def __init__(self, track_id, user, score, name=None):
+        """user is the recognized user key; name is what the window shows"""
+        self.track_id = track_id
+        self.user = user
+        self.name = name if name is not None else user
+        self.score = score
+
+
+class IdVerifier:
+    def __init__(self, root, on_result):
+        """
+        root is the Tk root, or a function returning it so it is only
+        created when the first window opens. on_result(request, entered_id)
+        is called from poll() once someone submits an ID. entered_id is
+        None when the check is cancelled.
+        """
+        self._root = root
+        self.on_result = on_result
+        self.queue = deque()
+        self.current = None
+        self._window = None
+        self._entry = None
+        self._answers = deque()
+        self._tk_started = False
+
+    @property
+    def root(self):
+        return self._root() if callable(self._root) else self._root
+
+    def pending(self):
+        """All requests waiting for an ID, the one on screen first"""
+        return ([self.current] if self.current else []) + list(self.queue)
+
+    def is_pending(self, track_id=None, user=None):
+        """Whether a track or a user already has an ID check waiting"""
+        return any(r.track_id == track_id or r.user == user for r in self.pending())
+
+    def submit(self, track_id, user, score, name=None):
+        """Queue an ID check for a matched face. Returns False if one is already waiting."""
+        if self.is_pending(track_id, user):
+            return False
+        self.queue.append(VerificationRequest(track_id, user, score, name))
+        return True
+
+    def cancel(self, track_id):
+        """Drop the ID check for a track, e.g. when the person walks away"""
+        self.queue = deque(r for r in self.queue if r.track_id != track_id)
+        if self.current and self.current.track_id == track_id:
+            self._close()
+
+    def poll(self):
+        """Process Tk events and deliver answers. Call once per camera frame."""
+        if self.current is None and self.queue:
+            self._open(self.queue.popleft())
+
+        # Until the first window has been opened there are no Tk events to process
+        if self._tk_started:
+            import tkinter as tk
+            try:
+                self.root.update()
+            except tk.TclError:
+                pass
+
+        while self._answers:
+            request, entered_id = self._answers.popleft()
+            self.on_result(request, entered_id)
+
+    def _open(self, request):
+        import tkinter as tk
+        self._tk_started = True
+        self.current = request
+        window = tk.Toplevel(self.root)
+        window.title("Security Check")
+        window.attributes("-topmost", True)
+        window.protocol("WM_DELETE_WINDOW", lambda: self._answer(None))
+
+        tk.Label(window, text=f"Face Recognized: {request.name}\n\nPlease enter your ID Number:",
+                 font=("Arial", 12)).pack(padx=20, pady=10)
+        entry = tk.Entry(window, font=("Arial", 14), justify="center")
+        entry.pack(padx=20, pady=5)
+        entry.bind("<Return>", lambda event: self._answer(entry.get()))
+        entry.bind("<Escape>", lambda event: self._answer(None))
+
+        buttons = tk.Frame(window)
+        buttons.pack(pady=10)
+        tk.Button(buttons, text="OK", width=8, command=lambda: self._answer(entry.get())).pack(side="left", padx=5)
+        tk.Button(buttons, text="Cancel", width=8, command=lambda: self._answer(None)).pack(side="left", padx=5)
+
+        entry.focus_force()
+        self._window = window
+        self._entry = entry
+
+    def _answer(self, entered_id):
+        if self.current is not None:
+            self._answers.append((self.current, entered_id))
+        self._close()
+
+    def _close(self):
+        if self._window is not None:
+            self._window.destroy()
+        self._window = None
+        self._entry = None
+        self.current = None
+
+
+class ScriptedVerifier(IdVerifier):
+    def __init__(self, answer_fn, on_result):
+        """
+        Answers every request on the next poll() with answer_fn(request),
+        which returns the ID to "type", or None to cancel.
+        """
+        super().__init__(None, on_result)
+        self.answer_fn = answer_fn
+
+    def poll(self):
+        while self.queue:
+            request = self.queue.popleft()
+            self.on_result(request, self.answer_fn(request))
@@ -0,0 +1,213 @@
+"""
+Instrumentation for the recognition loop.
+Stage timers keep a rolling window of durations (p50/p95/p99) and
+counters track frames, faces, recognitions, matches and denials. When
+instrumentation is off, timers are a shared no-op context and counters
+return immediately, so the hooks can stay in the hot path.
+
+Turn it on with --metrics TARGET or the FACEID_METRICS environment
+variable. TARGET is a file path (rewritten every few seconds) or
+HOST:PORT, which serves /metrics (Prometheus text) and /metrics.json:
+
+    python security_system_database.py --metrics metrics.json
+    FACEID_METRICS=127.0.0.1:9100 python multi_stream.py 0 1
+"""
+
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+METRICS_ENV = "FACEID_METRICS"
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+
+class Metrics:
+    def __init__(self, enabled=False, window=1000):
+        """window is how many recent durations each stage keeps for percentiles"""
+        self.enabled = enabled
+        self.window = window
+        self.started_at = time.time()
+        self.counters = {}
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def timer(self, stage):
+        """Context manager timing one run of a stage"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        """Record one duration for a stage"""
+        if not self.enabled:
+            return
+        samples = self.stages.get(stage)
+        if samples is None:
+            with self._lock:
+                samples = self.stages.setdefault(stage, [0, deque(maxlen=self.window)])
+        samples[0] += 1
+        samples[1].append(seconds)
+
+    def count(self, name, n=1):
+        """Add n to a counter"""
+        if not self.enabled or not n:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self):
+        """Counters and per-stage latency percentiles as a dict"""
+        with self._lock:
+            counters = dict(self.counters)
+            stages = {stage: (total, list(samples)) for stage, (total, samples) in self.stages.items()}
+
+        summary = {}
+        for stage, (total, samples) in stages.items():
+            ms = np.asarray(samples) * 1000.0
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+            summary[stage] = {"count": total, "p50_ms": round(float(p50), 3),
+                              "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3)}
+        return {"timestamp": time.time(), "uptime_s": round(time.time() - self.started_at, 1),
+                "counters": counters, "stages": summary}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Snapshot in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = f"faceid_{name}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+
+        if snapshot["stages"]:
+            lines.append("# TYPE faceid_stage_seconds summary")
+        for stage, stats in sorted(snapshot["stages"].items()):
+            for quantile, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+                lines.append(f'faceid_stage_seconds{{stage="{stage}",quantile="{quantile}"}} '
+                             f'{stats[key] / 1000.0:.6f}')
+            lines.append(f'faceid_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+
+        lines += ["# TYPE faceid_uptime_seconds gauge", f"faceid_uptime_seconds {snapshot['uptime_s']}"]
+        return "\n".join(lines) + "\n"
+
+
+def _is_socket_target(target):
+    return re.fullmatch(r"[\w.\-]*:\d+", target) is not None
+
+
+class MetricsExporter:
+    def __init__(self, metrics, target, fmt=None, interval=5.0):
+        """
+        Publish snapshots of metrics to target: a file rewritten every
+        interval seconds, or HOST:PORT served over HTTP on demand.
+        fmt is "json" or "prometheus"; by default a file ending in .prom
+        gets Prometheus text and anything else JSON.
+        """
+        self.metrics = metrics
+        self.target = target
+        self.fmt = fmt or ("prometheus" if target.endswith(".prom") else "json")
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+
+    def render(self, fmt=None):
+        if (fmt or self.fmt) == "prometheus":
+            return self.metrics.to_prometheus()
+        return self.metrics.to_json()
+
+    def start(self):
+        if _is_socket_target(self.target):
+            host, port = self.target.rsplit(":", 1)
+            self._server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), self._handler())
+            self._thread = threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True)
+            print(f"✓ Metrics served at http://{host or '127.0.0.1'}:{port}/metrics")
+        else:
+            self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+            print(f"✓ Metrics written to {self.target} every {self.interval:g}s")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        elif self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self.write()
+
+    def write(self):
+        """Write one snapshot to the target file"""
+        tmp_path = self.target + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(self.render())
+            os.replace(tmp_path, self.target)
+        except OSError as e:
+            print(f"Warning: Could not write metrics to '{self.target}': {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def _handler(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path not in ("/metrics", "/metrics.json"):
+                    self.send_error(404)
+                    return
+                fmt = "json" if path.endswith(".json") else "prometheus"
+                body = exporter.render(fmt).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json" if fmt == "json"
+                                 else "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def start_metrics(metrics, target=None, fmt=None, interval=5.0):
+    """
+    Enable metrics and start exporting if a target is given, or set in
+    FACEID_METRICS. Returns the exporter, or None when metrics stay off.
+    """
+    target = target or os.environ.get(METRICS_ENV)
+    if not target:
+        return None
+    metrics.enabled = True
+    exporter = MetricsExporter(metrics, target, fmt, interval)
+    exporter.start()
+    return exporter
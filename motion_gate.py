@@ -0,0 +1,44 @@
+"""
+Cheap motion check for deciding when face detection is worth running.
+Each frame is shrunk to a thumbnail and compared with a slowly updated
+background; if enough thumbnail pixels changed, something moved. On an
+empty, static scene this costs a resize and a few thousand pixel
+comparisons instead of a full cascade pass.
+"""
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    def __init__(self, size=(64, 48), threshold=20, min_changed=0.005, learning_rate=0.05):
+        """
+        size is the thumbnail (width, height). A pixel has changed when it
+        differs from the background by more than threshold gray levels, and
+        motion means at least min_changed of the pixels changed. The
+        background follows slow changes like daylight at learning_rate.
+        """
+        self.size = size
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.learning_rate = learning_rate
+        self.background = None
+
+    def reset(self):
+        """Forget the background, e.g. after the scene was busy for a while"""
+        self.background = None
+
+    def moved(self, image):
+        """Whether image (gray or BGR) differs from the background. The first frame counts as motion."""
+        small = cv2.resize(image, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(small, (5, 5), 0).astype(np.float32)
+
+        if self.background is None or self.background.shape != small.shape:
+            self.background = small
+            return True
+
+        changed = np.count_nonzero(cv2.absdiff(small, self.background) > self.threshold)
+        cv2.accumulateWeighted(small, self.background, self.learning_rate)
+        return changed >= self.min_changed * small.size
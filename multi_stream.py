@@ -0,0 +1,210 @@
+"""
+Multi-stream serving: one process watching several cameras.
+Every source gets its own capture and detection threads, while all of
+them share one loaded gallery and one pool of recognition workers.
+Recognitions are written to the access log with the stream they came from.
+
+    python multi_stream.py 0 1 rtsp://gate3/stream entrance.mp4 --workers 4
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from camera_pipeline import FramePipeline
+from face_detection import ScaledFaceDetector
+from face_tracker import FaceTracker
+from frame_scheduler import FrameScheduler, add_scheduler_arguments, scheduler_from_args
+from metrics import start_metrics
+from security_system_database import SimpleFaceIDSystem
+
+
+def open_source(source):
+    """Open a device index, video file or stream URL"""
+    if str(source).isdigit():
+        return cv2.VideoCapture(int(source), cv2.CAP_DSHOW)
+    return cv2.VideoCapture(source)
+
+
+class MultiStreamServer:
+    def __init__(self, app, sources, workers=None, repeat_seconds=10.0):
+        """
+        app is a loaded SimpleFaceIDSystem whose gallery all streams share.
+        The same person on the same stream is logged at most once every
+        repeat_seconds.
+        """
+        self.app = app
+        self.sources = list(sources)
+        self.workers = workers or os.cpu_count() or 1
+        self.repeat_seconds = repeat_seconds
+        self.pool = None
+        self.streams = {}
+        self.detectors = {}
+        self.trackers = {}
+        self.schedulers = {}
+        self._last_logged = {}
+
+    def _tracker_for(self, stream_id):
+        tracker = self.app.tracker
+        self.trackers[stream_id] = FaceTracker(
+            max_distance=tracker.max_distance, max_missed=tracker.max_missed, min_iou=tracker.min_iou,
+            min_votes=tracker.min_votes, min_confidence=tracker.min_confidence,
+            stale_frames=tracker.stale_frames, full_detect_every=tracker.full_detect_every,
+            roi_margin=tracker.roi_margin, use_cv_tracker=tracker.use_cv_tracker,
+            vote_window=tracker.vote_window)
+        return self.trackers[stream_id]
+
+    def _scheduler_for(self, stream_id):
+        # Every stream gets the app's scheduler settings, its CPU budget included
+        self.schedulers[stream_id] = FrameScheduler(**self.app.scheduler.settings())
+        return self.schedulers[stream_id]
+
+    def _detector_for(self, stream_id):
+        self.detectors[stream_id] = self.app.face_detector.clone()
+        return self.detectors[stream_id]
+
+    def start(self):
+        """Open every source and start its pipeline. Returns the number started."""
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="recognize")
+        for i, source in enumerate(self.sources):
+            stream_id = f"stream{i}"
+            video_capture = open_source(source)
+            if not video_capture.isOpened():
+                print(f"Warning: Could not open {source}")
+                continue
+
+            # Recognition only reads the shared gallery, so streams never copy it.
+            # Each stream tracks its own faces and only recognizes new or uncertain ones.
+            detector = self._detector_for(stream_id)
+            tracker = self._tracker_for(stream_id)
+            scheduler = self._scheduler_for(stream_id)
+            pipeline = FramePipeline(video_capture,
+                                     lambda frame_id, frame, gray, tracker=tracker, scheduler=scheduler,
+                                            detector=detector:
+                                         self.app.track_faces(frame_id, frame, gray, tracker, scheduler, detector),
+                                     lambda frame_id, gray, faces, tracker=tracker, scheduler=scheduler:
+                                         self.app.recognize_faces(frame_id, gray, faces, tracker, scheduler),
+                                     queue_size=self.app.pipeline_queue_size,
+                                     recognition_pool=self.pool, stream_id=stream_id,
+                                     metrics=self.app.metrics)
+            pipeline.start()
+            self.streams[stream_id] = (source, video_capture, pipeline)
+            print(f"✓ {stream_id}: {source}")
+        return len(self.streams)
+
+    def stop(self):
+        for _, video_capture, pipeline in self.streams.values():
+            pipeline.stop()
+            video_capture.release()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+
+    def handle_results(self):
+        """Log new recognitions from every stream"""
+        now = time.time()
+        for stream_id, (_, _, pipeline) in self.streams.items():
+            item = pipeline.result_queue.get_nowait()
+            if item is None:
+                continue
+            for _, name, score in item[2]:
+                if not name or name == "Scanning..." or name not in self.app.user_names:
+                    continue
+                key = (stream_id, name)
+                if now - self._last_logged.get(key, 0) < self.repeat_seconds:
+                    continue
+                self._last_logged[key] = now
+                self.app.log_activity(self.app.display_name(name), "RECOGNIZED", score=score,
+                                      stream_id=stream_id)
+
+    def stats(self):
+        """Per-stream fps, latency and queue figures"""
+        stats = {}
+        for stream_id, (source, _, pipeline) in self.streams.items():
+            elapsed = time.time() - pipeline.started_at
+            stats[stream_id] = dict(source=str(source), tracker=self.trackers[stream_id].summary(elapsed),
+                                    scheduler=self.schedulers[stream_id].summary(), **pipeline.stats())
+        return stats
+
+    def print_stats(self):
+        total = 0.0
+        for stream_id, stats in self.stats().items():
+            latency = stats["latency_ms"] or {"p50": 0.0, "p95": 0.0}
+            total += stats["detect_fps"]
+            print(f"  {stream_id}: {stats['fps']:.1f} fps captured, {stats['detect_fps']:.1f} fps processed, "
+                  f"{stats['recognize']['frames']} recognized, "
+                  f"latency p50 {latency['p50']:.0f} ms / p95 {latency['p95']:.0f} ms, "
+                  f"dropped {stats['capture']['dropped']}, "
+                  f"{stats['scheduler']['detections_skipped']} detections skipped "
+                  f"({stats['scheduler']['motion_skipped']} on a static scene), "
+                  f"{stats['tracker']['recognitions_saved_per_sec']:.1f} recognitions/s saved by tracking")
+        print(f"  total: {total:.1f} fps processed")
+
+    def run(self, report_every=5.0, display=False):
+        """Serve until every stream ends, 'q' is pressed or Ctrl+C"""
+        if not self.start():
+            print("Error: No sources could be opened.")
+            return
+
+        last_report = time.time()
+        try:
+            while any(pipeline.running for _, _, pipeline in self.streams.values()):
+                self.handle_results()
+
+                if display:
+                    for stream_id, (_, _, pipeline) in self.streams.items():
+                        if pipeline.latest_frame is None:
+                            continue
+                        frame = pipeline.latest_frame[1].copy()
+                        self.app.draw_results(frame, pipeline.latest_faces[1], pipeline.latest_results[1])
+                        cv2.imshow(f"Face Recognition - {stream_id}", frame)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+                else:
+                    time.sleep(0.01)
+
+                if time.time() - last_report >= report_every:
+                    last_report = time.time()
+                    print("\n=== STREAM STATS ===")
+                    self.print_stats()
+        except KeyboardInterrupt:
+            print("\nStopping...")
+        finally:
+            self.handle_results()
+            self.stop()
+            if display:
+                cv2.destroyAllWindows()
+
+        print("\n=== FINAL STREAM STATS ===")
+        self.print_stats()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve several cameras from one process")
+    parser.add_argument("sources", nargs="+", help="device indices, video files or stream URLs")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="recognition worker threads shared by all streams (0 = one per CPU core)")
+    parser.add_argument("--database", default="training photos", help="photo folder or gallery file")
+    parser.add_argument("--detect-scale", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--face-distance", type=float, nargs=2, metavar=("NEAR", "FAR"))
+    parser.add_argument("--display", action="store_true", help="show a window per stream")
+    parser.add_argument("--metrics", metavar="TARGET",
+                        help="export timings and counters to a file or HOST:PORT (also FACEID_METRICS)")
+    parser.add_argument("--report-every", type=float, default=5.0, help="seconds between stats reports")
+    add_scheduler_arguments(parser)
+    args = parser.parse_args()
+
+    app = SimpleFaceIDSystem(headless=True)
+    app.database_folder = args.database
+    app.scheduler = scheduler_from_args(args)
+    app.face_detector = ScaledFaceDetector(app.face_cascade, scales=args.detect_scale,
+                                           distance_range=args.face_distance)
+    if app.load_database():
+        exporter = start_metrics(app.metrics, args.metrics)
+        try:
+            MultiStreamServer(app, args.sources, args.workers).run(args.report_every, args.display)
+        finally:
+            if exporter is not None:
+                exporter.stop()
@@ -3,10 +3,15 @@ Create a test user for the face database using webcam
 This will capture your photo and add you as "Test User" with ID 9999
 """
 
+import argparse
 import cv2
 import os
 
-def capture_test_user():
+from enrollment import BurstEnroller, add_burst_arguments, burst_settings, report_burst
+from face_detection import ScaledFaceDetector
+
+def capture_test_user(burst=None):
+    """burst holds BurstEnroller settings for the B key (see enrollment.py)"""
     print("\n" + "="*60)
     print("  QUICK TEST - Capture Your Face")
     print("="*60)
@@ -14,7 +19,7 @@ def capture_test_user():
     print("  Name: Test_User")
     print("  ID: 9999")
     print("\n1. Look at the camera")
-    print("2. Press SPACE to capture")
+    print("2. Press SPACE to capture, or B for a burst of face templates")
     print("3. Press ESC to cancel")
     print("="*60)
     
@@ -34,8 +39,14 @@ def capture_test_user():
     
     face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
     
+    # The preview only needs to know a face is there, so detect at half resolution;
+    # the saved photo is still the full frame
+    face_detector = ScaledFaceDetector(face_cascade, scales=(0.5,))
+    
     print("\nCamera active! Press SPACE when ready...\n")
     
+    enroller = None
+    
     while True:
         ret, frame = cap.read()
         if not ret:
@@ -43,7 +54,7 @@ def capture_test_user():
             break
         
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+        faces = face_detector.detect(gray)
         
         # Draw face detection
         for (x, y, w, h) in faces:
@@ -52,18 +63,31 @@ def capture_test_user():
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
         
         # Instructions
-        cv2.putText(frame, "SPACE: Capture | ESC: Cancel", (10, 30),
+        cv2.putText(frame, "SPACE: Capture | B: Burst | ESC: Cancel", (10, 30),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
         
         if len(faces) == 0:
             cv2.putText(frame, "Position your face in frame", (10, 60),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
         
+        # Burst: templates are cropped and written in the background
+        if enroller is not None and enroller.step(gray, faces, frame):
+            written = enroller.finish()
+            report_burst(enroller)
+            cap.release()
+            cv2.destroyAllWindows()
+            return bool(written)
+        
         cv2.imshow('Capture Test User Photo', frame)
         
         key = cv2.waitKey(1) & 0xFF
         
-        if key == 32:  # SPACE
+        if key in (ord('b'), ord('B')) and enroller is None:
+            enroller = BurstEnroller("training photos", "Test_User", "9999", **(burst or {}))
+            enroller.start()
+            print("Burst started - look at the camera and turn your head slightly...")
+        
+        elif key == 32 and enroller is None:  # SPACE
             if len(faces) > 0:
                 cv2.imwrite(filename, frame)
                 print(f"✓ Photo saved: {filename}")
@@ -74,6 +98,9 @@ def capture_test_user():
                 print("No face detected! Please position yourself in frame.")
         
         elif key == 27:  # ESC
+            if enroller is not None:
+                enroller.finish()
+                report_burst(enroller)
             print("Cancelled.")
             cap.release()
             cv2.destroyAllWindows()
@@ -84,11 +111,15 @@ def capture_test_user():
     return False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Capture a test user for the face database")
+    add_burst_arguments(parser)
+    args = parser.parse_args()
+    
     print("\n" + "="*60)
     print("  CREATING TEST USER FOR FACE DATABASE")
     print("="*60)
     
-    if capture_test_user():
+    if capture_test_user(burst_settings(args)):
         print("\n" + "="*60)
         print("✓ Test user created successfully!")
         print("\nYou can now run the main system:")
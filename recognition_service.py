@@ -0,0 +1,418 @@
+"""
+Headless recognition service.
+Loads the gallery once and answers "who is this?" over HTTP or a Unix
+socket, for door controllers and kiosks that have no screen of their own.
+Requests are handed to a pool of workers; each worker takes whatever
+requests are waiting (up to max_batch) and matches all their faces in
+one batched gallery lookup.
+
+    python recognition_service.py --port 8000 --workers 4
+    python recognition_service.py --unix /tmp/faceid.sock
+    python recognition_service.py --bench sample_faces/ --concurrency 8
+
+Endpoints:
+    POST /recognize          JPEG/PNG bytes, or raw 8-bit grayscale with
+                             ?width=W&height=H. Add ?crop=1 when the image is
+                             already a face crop, to skip detection.
+    POST /recognize/batch    {"images": [base64, ...], "crop": false}
+    GET  /health
+"""
+
+import argparse
+import base64
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+from face_detection import ScaledFaceDetector
+from security_system_database import SimpleFaceIDSystem
+
+
+class ServiceRequest:
+    def __init__(self, data, crop=False, raw_shape=None):
+        self.data = data
+        self.crop = crop
+        self.raw_shape = raw_shape
+        self.future = Future()
+        self.received_at = time.perf_counter()
+
+
+def decode_image(data, raw_shape=None):
+    """Grayscale image from JPEG/PNG bytes, or raw 8-bit pixels of raw_shape (height, width)"""
+    if raw_shape is not None:
+        height, width = raw_shape
+        if height <= 0 or width <= 0:
+            raise ValueError(f"Raw image size must be positive, got {width}x{height}")
+        if len(data) != height * width:
+            raise ValueError(f"Expected {height * width} bytes of raw pixels, got {len(data)}")
+        return np.frombuffer(data, dtype=np.uint8).reshape(height, width)
+
+    gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError("Could not decode image")
+    return gray
+
+
+class RecognitionService:
+    def __init__(self, app, workers=None, max_batch=16, batch_wait=0.002):
+        """
+        app is a loaded SimpleFaceIDSystem. Each worker waits up to
+        batch_wait seconds after the first request for more to batch with.
+        """
+        self.app = app
+        self.workers = workers or os.cpu_count() or 1
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait
+        self.requests = queue.Queue()
+        self.counts = {"requests": 0, "faces": 0, "batches": 0, "errors": 0}
+        self.started_at = None
+        self._threads = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._running = False
+
+    def start(self):
+        self._running = True
+        self.started_at = time.time()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"recognize-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"✓ Recognition service ready: {self.workers} workers, batches of up to {self.max_batch}")
+
+    def stop(self):
+        self._running = False
+        for _ in self._threads:
+            self.requests.put(None)
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+    def submit(self, data, crop=False, raw_shape=None):
+        """Queue one image. Returns a Future for its result dict."""
+        request = ServiceRequest(data, crop, raw_shape)
+        self.requests.put(request)
+        return request.future
+
+    def recognize(self, data, crop=False, raw_shape=None, timeout=30.0):
+        return self.submit(data, crop, raw_shape).result(timeout)
+
+    def _detector(self):
+        detector = getattr(self._local, "detector", None)
+        if detector is None:
+            detector = self._local.detector = self.app.face_detector.clone()
+        return detector
+
+    def _next_batch(self):
+        request = self.requests.get()
+        if request is None:
+            return None
+        batch = [request]
+        deadline = time.perf_counter() + self.batch_wait
+        while len(batch) < self.max_batch:
+            try:
+                request = self.requests.get(timeout=max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                break
+            if request is None:
+                # Let the other workers see the stop signal too
+                self.requests.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._process(batch)
+            except Exception as e:
+                # Fail this batch's requests, but keep the worker serving
+                print(f"Error in recognition service: {e}")
+                for request in batch:
+                    if not request.future.done():
+                        with self._lock:
+                            self.counts["errors"] += 1
+                        request.future.set_exception(e)
+
+    def _process(self, batch):
+        """Decode and detect each request, then match every face of the batch at once"""
+        started = time.perf_counter()
+        prepared = []
+        crops = []
+        for request in batch:
+            t0 = time.perf_counter()
+            try:
+                gray = decode_image(request.data, request.raw_shape)
+                t1 = time.perf_counter()
+                if request.crop:
+                    boxes = [(0, 0, gray.shape[1], gray.shape[0])]
+                else:
+                    boxes = [tuple(int(v) for v in box) for box in self._detector().detect(gray)]
+                # Empty crops cannot be matched
+                boxes = [box for box in boxes if box[2] > 0 and box[3] > 0]
+                t2 = time.perf_counter()
+            except Exception as e:
+                with self._lock:
+                    self.counts["errors"] += 1
+                request.future.set_exception(e)
+                continue
+            prepared.append((request, boxes, len(crops), t1 - t0, t2 - t1))
+            crops.extend(gray[y:y+h, x:x+w] for (x, y, w, h) in boxes)
+
+        t_match = time.perf_counter()
+        matches = self.app.match_crops(crops)
+        match_ms = (time.perf_counter() - t_match) * 1000.0
+        with self._lock:
+            self.counts["batches"] += 1
+            self.counts["faces"] += len(crops)
+            self.counts["requests"] += len(prepared)
+
+        done = time.perf_counter()
+        for request, boxes, first, decode_s, detect_s in prepared:
+            faces = []
+            for box, (user, score) in zip(boxes, matches[first:first + len(boxes)]):
+                # Never the ID: it is the second factor of the gate
+                faces.append({"box": list(box), "name": self.app.display_name(user) if user else None,
+                              "score": round(float(score), 4)})
+            request.future.set_result({
+                "faces": faces,
+                "timing_ms": {"queue": round((started - request.received_at) * 1000.0, 3),
+                              "decode": round(decode_s * 1000.0, 3),
+                              "detect": round(detect_s * 1000.0, 3),
+                              "match": round(match_ms, 3),
+                              "total": round((done - request.received_at) * 1000.0, 3)},
+                "batch_size": len(batch),
+            })
+
+    def stats(self):
+        elapsed = max(time.time() - self.started_at, 1e-6) if self.started_at else None
+        return dict(self.counts, users=len(self.app.gallery), workers=self.workers,
+                    requests_per_sec=round(self.counts["requests"] / elapsed, 2) if elapsed else 0.0)
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Buffer each response so headers and body leave in one send;
+        # separate small sends stall on the client's delayed ACK under Nagle.
+        # (TCP_NODELAY alone would not do, Unix sockets do not support it.)
+        wbufsize = 64 * 1024
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlparse(self.path).path == "/health":
+                self._reply(200, service.stats())
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if url.path == "/recognize":
+                    raw_shape = None
+                    if "width" in params:
+                        raw_shape = (int(params["height"]), int(params["width"]))
+                    result = service.recognize(body, params.get("crop") == "1", raw_shape)
+                elif url.path == "/recognize/batch":
+                    request = json.loads(body)
+                    futures = [service.submit(base64.b64decode(image), bool(request.get("crop")))
+                               for image in request["images"]]
+                    result = {"results": []}
+                    for future in futures:
+                        try:
+                            result["results"].append(future.result(30.0))
+                        except Exception as e:
+                            result["results"].append({"error": str(e) or type(e).__name__})
+                else:
+                    self._reply(404, {"error": "not found"})
+                    return
+            except (ValueError, KeyError, TypeError) as e:
+                self._reply(400, {"error": str(e)})
+                return
+            except Exception as e:
+                self._reply(500, {"error": str(e) or type(e).__name__})
+                return
+            self._reply(200, result)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ("unix", 0)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=30.0):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def serve(service, host="127.0.0.1", port=8000, unix_path=None):
+    """Create the HTTP server (TCP or Unix socket). The caller runs serve_forever()."""
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.remove(unix_path)
+        server = UnixHTTPServer(unix_path, make_handler(service))
+        print(f"✓ Listening on unix:{unix_path}")
+    else:
+        server = ThreadingHTTPServer((host, port), make_handler(service))
+        server.daemon_threads = True
+        print(f"✓ Listening on http://{host}:{server.server_address[1]}")
+    return server
+
+
+def bench(connect, images, concurrency=8, seconds=10.0, crop=False):
+    """
+    Stand-in client: concurrency threads post images back to back for
+    seconds. Returns sustained requests per second and latency percentiles.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    path = "/recognize?crop=1" if crop else "/recognize"
+
+    def client(offset):
+        connection = connect()
+        i = offset
+        while time.perf_counter() < deadline:
+            data = images[i % len(images)]
+            i += 1
+            t0 = time.perf_counter()
+            try:
+                connection.request("POST", path, body=data,
+                                   headers={"Content-Type": "application/octet-stream"})
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+                connection.close()
+                connection = connect()
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - t0)
+                else:
+                    errors[0] += 1
+        connection.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    ms = np.asarray(latencies) * 1000.0
+    report = {"requests": len(latencies), "errors": errors[0], "seconds": round(elapsed, 2),
+              "concurrency": concurrency,
+              "requests_per_sec": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0}
+    if len(ms):
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        report.update(p50_ms=round(float(p50), 2), p95_ms=round(float(p95), 2), p99_ms=round(float(p99), 2))
+    return report
+
+
+def load_bench_images(folder):
+    """Encoded bytes of every image in a folder"""
+    images = []
+    for filename in sorted(os.listdir(folder)):
+        if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+            with open(os.path.join(folder, filename), "rb") as f:
+                images.append(f.read())
+    return images
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless face recognition service")
+    parser.add_argument("--database", default="training photos", help="photo folder or gallery file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=0, help="recognition workers (0 = one per CPU core)")
+    parser.add_argument("--max-batch", type=int, default=16, help="most requests matched together")
+    parser.add_argument("--detect-scale", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--bench", metavar="FOLDER",
+                        help="serve in the background and load it with a stand-in client posting these images")
+    parser.add_argument("--concurrency", type=int, default=8, help="bench client threads")
+    parser.add_argument("--seconds", type=float, default=10.0, help="bench duration")
+    parser.add_argument("--crop", action="store_true", help="bench images are face crops")
+    args = parser.parse_args()
+
+    app = SimpleFaceIDSystem(headless=True)
+    app.database_folder = args.database
+    app.face_detector = ScaledFaceDetector(app.face_cascade, scales=args.detect_scale)
+    if not app.load_database():
+        raise SystemExit(1)
+
+    service = RecognitionService(app, args.workers, args.max_batch)
+    service.start()
+    server = serve(service, args.host, 0 if args.bench and not args.unix else args.port, args.unix)
+
+    if not args.bench:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nStopping...")
+        finally:
+            server.server_close()
+            service.stop()
+            if args.unix and os.path.exists(args.unix):
+                os.remove(args.unix)
+            print(f"Service stats: {service.stats()}")
+    else:
+        images = load_bench_images(args.bench)
+        if not images:
+            print(f"Error: No images found in '{args.bench}'.")
+            raise SystemExit(1)
+
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        if args.unix:
+            connect = lambda: UnixHTTPConnection(args.unix)
+        else:
+            connect = lambda: http.client.HTTPConnection(args.host, server.server_address[1], timeout=30)
+
+        print(f"\nBenchmarking {len(images)} image(s) with {args.concurrency} clients for {args.seconds:g}s...")
+        report = bench(connect, images, args.concurrency, args.seconds, args.crop)
+        server.shutdown()
+        server.server_close()
+        service.stop()
+        report["service"] = service.stats()
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,211 @@
+"""
+Headless replay of the recognition loop.
+Feeds a video file or a folder of frames through the same detection and
+recognition steps as SimpleFaceIDSystem.start_camera, answers ID checks
+from a script, and prints throughput and per-stage latency as JSON.
+
+    python replay.py gate_recording.mp4 --answer correct --output run.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from face_detection import ScaledFaceDetector
+from face_gallery import add_gallery_arguments
+from face_store import add_store_arguments
+from face_tracker import add_tracker_arguments, tracker_from_args
+from frame_scheduler import add_scheduler_arguments, scheduler_from_args
+from id_verification import ScriptedVerifier
+from security_system_database import SimpleFaceIDSystem
+
+STAGES = ("capture", "convert", "detect", "recognize", "verify", "total")
+
+
+def iter_frames(source, limit=None):
+    """Yield BGR frames from a video file or a folder of images"""
+    count = 0
+    if os.path.isdir(source):
+        for filename in sorted(os.listdir(source)):
+            if limit is not None and count >= limit:
+                return
+            if not filename.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
+                continue
+            frame = cv2.imread(os.path.join(source, filename))
+            if frame is None:
+                print(f"Warning: Could not load {filename}")
+                continue
+            count += 1
+            yield frame
+        return
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise IOError(f"Could not open video '{source}'")
+    try:
+        while limit is None or count < limit:
+            ret, frame = capture.read()
+            if not ret:
+                return
+            count += 1
+            yield frame
+    finally:
+        capture.release()
+
+
+def source_fps(source, default=30.0):
+    """Frame rate of a video file, or default for folders and unknown rates"""
+    if os.path.isdir(source):
+        return default
+    capture = cv2.VideoCapture(source)
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    capture.release()
+    return fps if fps and fps > 0 else default
+
+
+def latency_summary(samples):
+    """p50/p95/p99 and mean of a list of seconds, in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"count": len(ms), "mean_ms": round(float(ms.mean()), 3),
+            "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3)}
+
+
+def scripted_answer(app, answer):
+    """Build the answer function for ScriptedVerifier"""
+    def answer_fn(request):
+        if answer == "correct":
+            return app.user_dictionary.get(request.user)
+        if answer == "wrong":
+            return "not-" + str(app.user_dictionary.get(request.user))
+        if answer == "cancel":
+            return None
+        return answer
+    return answer_fn
+
+
+def replay(app, source, answer="correct", limit=None, fps=None):
+    """
+    Run every frame of a source through detection, recognition and ID checks.
+    The frame scheduler sees time pass at fps (by default the video's own
+    rate), so its decisions match what a live camera would get.
+    """
+    timings = {stage: [] for stage in STAGES}
+    counts = {"frames": 0, "faces": 0, "recognitions": 0, "matches": 0, "unknown": 0,
+              "granted": 0, "denied": 0, "cancelled": 0}
+    tracker = app.tracker
+    frame_id = 0
+    fps = fps or source_fps(source)
+    app.scheduler.clock = lambda: frame_id / fps
+
+    def on_result(request, entered_id):
+        if app.finish_id_check(request, entered_id, tracker, frame_id):
+            counts["granted"] += 1
+        elif entered_id is None:
+            counts["cancelled"] += 1
+        else:
+            counts["denied"] += 1
+
+    verifier = ScriptedVerifier(scripted_answer(app, answer), on_result)
+
+    frames = iter_frames(source, limit)
+    started = time.perf_counter()
+    while True:
+        t0 = time.perf_counter()
+        frame = next(frames, None)
+        if frame is None:
+            break
+        t1 = time.perf_counter()
+
+        frame_id += 1
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        t2 = time.perf_counter()
+
+        faces = app.track_faces(frame_id, frame, gray)
+        for track in tracker.lost:
+            verifier.cancel(track.track_id)
+        t3 = time.perf_counter()
+
+        results = app.recognize_faces(frame_id, gray, faces) if len(faces) > 0 else []
+        t4 = time.perf_counter()
+
+        app.queue_id_checks(frame_id, results, tracker, verifier)
+        verifier.poll()
+        t5 = time.perf_counter()
+
+        counts["frames"] += 1
+        counts["faces"] += len(faces)
+        for _, name, _ in results:
+            if name == "Scanning...":
+                continue
+            counts["recognitions"] += 1
+            counts["matches" if name else "unknown"] += 1
+
+        for stage, elapsed in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t5 - t0)):
+            timings[stage].append(elapsed)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "source": source,
+        "frames": counts["frames"],
+        "seconds": round(elapsed, 3),
+        "fps": round(counts["frames"] / elapsed, 2) if elapsed > 0 else 0.0,
+        "stages": {stage: latency_summary(samples) for stage, samples in timings.items()},
+        "counts": counts,
+        "tracker": tracker.summary(elapsed),
+        "scheduler": app.scheduler.summary(),
+        "database_bytes": sum(app.memory_report().values()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recording through the recognition loop")
+    parser.add_argument("source", help="video file or folder of frames")
+    parser.add_argument("--answer", default="correct",
+                        help="ID check answer: correct, wrong, cancel, or a literal ID")
+    parser.add_argument("--limit", type=int, help="stop after this many frames")
+    parser.add_argument("--database", default="training photos", help="photo folder or gallery file")
+    parser.add_argument("--detect-scale", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--face-distance", type=float, nargs=2, metavar=("NEAR", "FAR"))
+    add_gallery_arguments(parser)
+    add_store_arguments(parser)
+    add_tracker_arguments(parser)
+    parser.add_argument("--fps", type=float, help="frame rate the scheduler assumes (default: the video's)")
+    add_scheduler_arguments(parser)
+    parser.add_argument("--log", default="replay_access_logs.txt", help="access log for the replay")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    # Progress messages go to stderr so stdout is just the report
+    with contextlib.redirect_stdout(sys.stderr):
+        app = SimpleFaceIDSystem(headless=True)
+        app.database_folder = args.database
+        app.access_log.path = args.log
+        app.access_log.echo = False
+        app.face_detector = ScaledFaceDetector(app.face_cascade, scales=args.detect_scale,
+                                               distance_range=args.face_distance)
+        app.tracker = tracker_from_args(args)
+        app.shortlist_k, app.coarse_bins = args.shortlist, args.coarse_bins
+        app.max_templates, app.eviction = args.max_templates, args.eviction
+        app.feature_precision = args.feature_precision
+        app.scheduler = scheduler_from_args(args)
+        if not app.load_database():
+            sys.exit(1)
+        report = replay(app, args.source, args.answer, args.limit, args.fps)
+        app.access_log.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
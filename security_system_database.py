@@ -1,158 +1,625 @@
+import time
+_import_started = time.perf_counter()
 import cv2
-import tkinter as tk
-from tkinter import simpledialog, messagebox
 import os
 import numpy as np
-from datetime import datetime
 from pathlib import Path
 import pickle
+import hashlib
+import argparse
+import sys
+import threading
+from collections import namedtuple
+from face_gallery import FaceGallery, add_gallery_arguments, correlation_features, face_histogram
+from face_recognizers import BACKENDS, HistogramRecognizer, load_or_train
+from face_store import FaceStore, UserRecord, add_store_arguments
+from gallery_file import GalleryFile, write_gallery_file
+from gallery_watcher import GalleryWatcher
+from camera_pipeline import FramePipeline
+from face_detection import ScaledFaceDetector
+from face_tracker import FaceTracker, add_tracker_arguments, tracker_from_args
+from frame_scheduler import FrameScheduler, add_scheduler_arguments, scheduler_from_args
+from id_verification import IdVerifier
+from access_log import AccessLogWriter
+from metrics import Metrics, start_metrics
+from user_registry import UserRegistry, is_face_template, parse_user_filename, user_key
+from startup_profile import StartupProfile
+
+# Tkinter and the process pool are imported where they are first needed
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+# Bump when the way faces are cropped changes, so old caches get rebuilt
+CACHE_VERSION = 1
+
+# Size and mtime of a photo as recorded in the registry
+PhotoStat = namedtuple("PhotoStat", ["st_size", "st_mtime_ns"])
+
+
+def file_hash(path):
+    """SHA-1 of a file's contents"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_face(image_path, face_cascade):
+    """
+    Load an image and crop its largest face to 100x100 grayscale.
+    Enrolled face templates are already cropped and aligned, so they are
+    only resized. Returns (face_img, error) where error is None,
+    "unreadable" or "no_face".
+    """
+    if is_face_template(image_path):
+        face_img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if face_img is None:
+            return None, "unreadable"
+        return cv2.resize(face_img, (100, 100)), None
+    
+    img = cv2.imread(image_path)
+    if img is None:
+        return None, "unreadable"
+    
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+    
+    if len(faces) == 0:
+        return None, "no_face"
+    
+    # Get the largest face
+    (x, y, w, h) = max(faces, key=lambda face: face[2] * face[3])
+    face_img = gray[y:y+h, x:x+w]
+    return cv2.resize(face_img, (100, 100)), None
+
+
+# Cascade owned by each loader process
+_worker_cascade = None
+
+
+def _load_worker_cascade():
+    global _worker_cascade
+    _worker_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+
+def _init_worker():
+    """Set up a pool process: one cascade each, no nested OpenCV threads"""
+    cv2.setNumThreads(1)
+    _load_worker_cascade()
+
+
+def process_photo(image_path, face_cascade=None):
+    """Detect and crop one database photo. Returns (face_img, error, hash)."""
+    if face_cascade is None and not is_face_template(image_path):
+        if _worker_cascade is None:
+            _load_worker_cascade()
+        face_cascade = _worker_cascade
+    
+    face_img, error = extract_face(image_path, face_cascade)
+    digest = file_hash(image_path) if error != "unreadable" else None
+    return face_img, error, digest
+
 
 class SimpleFaceIDSystem:
-    def __init__(self):
+    def __init__(self, headless=False):
         # --- DATABASE CONFIGURATION ---
+        # A folder of Name_ID.jpg photos, or a gallery file built from one
         self.database_folder = "training photos"
         self.user_dictionary = {}
         
-        # Face detection
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        # Index of photo names and IDs, kept in sync with the folder (see user_registry.py)
+        self.registry_file = "user_registry.sqlite"
+        self._registry = None
         
-        # Store face data
-        self.known_faces = {}  # name: list of face images
-        self.user_ids = {}     # name: ID
+        # Processed crops are cached so restarts only re-detect changed photos
+        self.cache_file = "face_cache.pkl"
+        self.use_cache = True
         
-        # Initialize Tkinter (hidden)
-        self.root = tk.Tk()
-        self.root.withdraw()
+        # Processes used to detect faces in new photos (0 = one per CPU core)
+        self.load_workers = 1
+        
+        # Per-photo crops and features of the running database, for hot reload
+        self.photo_entries = {}
+        self.watcher = None
+        self._reload_cascade = None  # created by watch_database
+        self._reload_lock = threading.Lock()
+        
+        # Face detection: the cascade and detector are created on first use
+        # (camera frames can be detected at reduced resolution, see face_detection.py)
+        self._face_cascade = None
+        self._face_detector = None
+        
+        # Store face data: every crop in one array, grouped by user (see face_store.py).
+        # Users are keyed by ID (user_registry.user_key), and recognition
+        # returns that key: known_faces maps it to a view of the user's crops,
+        # user_ids (the same dict as user_dictionary) to the ID and
+        # user_names to the name shown on screen.
+        self.face_store = FaceStore([], np.zeros((0, 100, 100), np.uint8))
+        self.known_faces = {}
+        self.user_ids = self.user_dictionary
+        self.user_names = {}
+        
+        # At most max_templates photos per user are kept (None = all), the
+        # rest evicted by policy; features can be stored at reduced precision
+        self.max_templates = None
+        self.eviction = "oldest"
+        self.feature_precision = "float32"
+        
+        # Histograms of every stored face, built once per load
+        self.gallery = FaceGallery({})
+        self.match_threshold = 0.5
+        
+        # Galleries over 10x this many photos are matched in two stages:
+        # a coarse signature shortlists the closest photos, which alone get
+        # the full comparison (0 = always compare against every photo)
+        self.shortlist_k = 200
+        self.coarse_bins = 32
+        
+        # Recognizer backend (see face_recognizers.py). OpenCV models are saved
+        # to model_file and only retrained when the photos change.
+        self.recognizer_backend = "histogram"
+        self.recognizer_max_distance = None
+        self.model_file = "recognizer_{backend}.yml"
+        self.recognizer = HistogramRecognizer(self.gallery)
+        
+        # Camera loop: frames an access outcome stays on screen, and pipeline queue sizes
+        self.status_frames = 60
+        self.pipeline_queue_size = 1
+        self.pipeline = None
+        self.verifier = None
+        
+        # Faces are tracked across frames so a known person is not re-recognized,
+        # and the scheduler decides per frame whether to detect and recognize
+        self.tracker = FaceTracker()
+        self.scheduler = FrameScheduler()
+        
+        # Access attempts are written in batches off the camera thread
+        self.access_log = AccessLogWriter("access_logs.txt")
+        
+        # Stage timers and counters, off unless --metrics or FACEID_METRICS is set
+        self.metrics = Metrics()
+        
+        # Hidden Tkinter root, created the first time a window is needed;
+        # headless runs have no display at all
+        self.headless = headless
+        self._root = None
+
+    @property
+    def face_cascade(self):
+        if self._face_cascade is None:
+            self._face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        return self._face_cascade
+
+    @property
+    def face_detector(self):
+        if self._face_detector is None:
+            self._face_detector = ScaledFaceDetector(self.face_cascade)
+        return self._face_detector
+
+    @face_detector.setter
+    def face_detector(self, detector):
+        self._face_detector = detector
 
-    def log_activity(self, name, status):
-        """Log access attempts"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] User: {name} | Status: {status}\n"
+    @property
+    def root(self):
+        if self._root is None and not self.headless:
+            import tkinter as tk
+            self._root = tk.Tk()
+            self._root.withdraw()
+        return self._root
+
+    def display_name(self, user):
+        """Name to show for a recognized user key, never the key itself (it holds the ID)"""
+        return self.user_names.get(user, "Unknown")
+
+    def log_activity(self, name, status, score=None, stream_id=None):
+        """Log access attempts (written by a background thread)"""
+        self.access_log.log(name, status, score=score, stream_id=stream_id)
+
+    def _load_cache(self):
+        """Read the face template cache from disk"""
+        if not os.path.exists(self.cache_file):
+            return {}
         
         try:
-            with open("access_logs.txt", "a") as f:
-                f.write(log_entry)
-            print(f" >> Logged: {log_entry.strip()}")
+            with open(self.cache_file, "rb") as f:
+                cache = pickle.load(f)
         except Exception as e:
-            print(f"Error writing to log: {e}")
+            print(f"Warning: Ignoring unreadable cache '{self.cache_file}': {e}")
+            return {}
+        
+        if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION:
+            print("Cache format changed, rebuilding...")
+            return {}
+        
+        return cache.get("entries", {})
+
+    def _save_cache(self, entries):
+        """Write the face template cache to disk"""
+        tmp_file = self.cache_file + ".tmp"
+        try:
+            with open(tmp_file, "wb") as f:
+                pickle.dump({"version": CACHE_VERSION, "entries": entries}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(f"Warning: Could not save cache '{self.cache_file}': {e}")
+
+    def _cached_entry(self, cache, image_path, stat):
+        """Return the cached entry for a file if it is still valid"""
+        entry = cache.get(image_path)
+        if entry is None or entry["size"] != stat.st_size:
+            return None
+        
+        # An evicted photo has no crop; detect it again once the cap allows more
+        if entry.get("evicted") and (self.max_templates is None or self.max_templates > entry["evicted"]):
+            return None
+        
+        if entry["mtime"] == stat.st_mtime_ns:
+            return entry
+        
+        # Touched but maybe not changed: fall back to the content hash
+        if entry["hash"] == file_hash(image_path):
+            entry["mtime"] = stat.st_mtime_ns
+            return entry
+        
+        return None
+
+    def _detect_photos(self, image_paths, face_cascade=None):
+        """
+        Run face detection on photos, yielding (path, face_img, error, hash)
+        as each one finishes. Uses a process pool when load_workers > 1.
+        """
+        workers = self.load_workers or os.cpu_count() or 1
+        if workers <= 1 or len(image_paths) < 2:
+            for image_path in image_paths:
+                yield (image_path,) + process_photo(image_path, face_cascade)
+            return
+        
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        workers = min(workers, len(image_paths))
+        print(f"Detecting faces in {len(image_paths)} photo(s) with {workers} workers...")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {pool.submit(process_photo, image_path): image_path
+                       for image_path in image_paths}
+            for future in as_completed(futures):
+                image_path = futures[future]
+                try:
+                    yield (image_path,) + future.result()
+                except Exception as e:
+                    print(f"Warning: Failed to process {os.path.basename(image_path)}: {e}")
+
+    def _process_new_photos(self, stats, entries, face_cascade=None):
+        """
+        Detect faces in new or changed photos ({path: stat}) and store the
+        results in entries. Returns the paths already warned about.
+        """
+        reported = set()
+        for image_path, face_img, error, digest in self._detect_photos(list(stats), face_cascade):
+            filename = os.path.basename(image_path)
+            if error == "unreadable":
+                print(f"Warning: Could not load {filename}")
+                entries.pop(image_path, None)
+                continue
+            if error == "no_face":
+                print(f"Warning: No face detected in {filename}")
+                reported.add(image_path)
+            
+            stat = stats[image_path]
+            entries[image_path] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "hash": digest,
+                "face": face_img,
+            }
+        return reported
+
+    def _install_database(self, entries):
+        """
+        Build the user tables, gallery and recognizer from photo entries and
+        swap them in. Recognition only reads self.recognizer, which is
+        replaced in a single assignment, so it sees either the old or the
+        new database.
+        """
+        # Name and ID of each photo from the registry; the store keys users by ID
+        registered = {path: (name, user_id) for path, name, user_id, _, _ in self.registry.photos()}
+        photos = []
+        names_by_user = {}
+        for image_path, entry in entries.items():
+            if entry["face"] is None:
+                continue
+            name, user_id = (registered.get(image_path) or
+                             parse_user_filename(os.path.basename(image_path)))
+            names_by_user.setdefault(user_key(name, user_id), set()).add(name)
+            if "hist" not in entry:
+                entry["hist"] = face_histogram(entry["face"])
+            photos.append((image_path, name, user_id, entry["face"], entry["hist"], entry["mtime"]))
+        store = FaceStore.build(photos, self.max_templates, self.eviction)
+        for user in store.users:
+            if len(names_by_user[user.key]) > 1:
+                others = ", ".join(sorted(names_by_user[user.key] - {user.name}))
+                print(f"Warning: ID {user.user_id} is filed under several names; "
+                      f"using '{user.name}' (also: {others})")
+        
+        # Entries keep views into the store, so each crop is held once.
+        # Evicted photos keep only what the cache needs to skip them.
+        for row, image_path in enumerate(store.keys):
+            entries[image_path]["face"] = store.faces[row]
+            entries[image_path]["hist"] = store.hists[row]
+        for image_path in store.evicted:
+            entry = entries[image_path]
+            entry.pop("hist", None)
+            entry.update(face=None, evicted=self.max_templates)
+        evicted = sum(1 for entry in entries.values() if entry.get("evicted"))
+        if evicted:
+            print(f"✓ Template cap: {evicted} photo(s) over {self.max_templates} "
+                  f"per user evicted ({self.eviction})")
+        
+        gallery = FaceGallery.from_features(store.user_keys, store.offsets, correlation_features(store.hists))
+        gallery.set_precision(self.feature_precision)
+        gallery.use_shortlist(self.shortlist_k, self.coarse_bins)
+        rows = {image_path: row for row, image_path in enumerate(store.keys)}
+        recognizer = self._build_recognizer(
+            gallery, {path: (store.users[store.labels[row]].key, entries[path]["hash"])
+                      for path, row in rows.items()},
+            lambda path: store.faces[rows[path]])
+        
+        self.photo_entries = entries
+        self.face_store = store
+        self.known_faces = store.known_faces()
+        self.user_dictionary = self.user_ids = store.user_ids()
+        self.user_names = store.display_names()
+        self.gallery = gallery
+        self.recognizer = recognizer
+
+    def _build_recognizer(self, gallery, photos, face_of):
+        """
+        Recognizer for the selected backend. The histogram one wraps the
+        gallery; OpenCV ones come from load_or_train, falling back to
+        histograms if they cannot be trained.
+        """
+        backend = self.recognizer_backend
+        if backend == "histogram":
+            return HistogramRecognizer(gallery)
+        
+        path = self.model_file.format(backend=backend)
+        try:
+            recognizer, how = load_or_train(backend, path, photos, face_of, self.recognizer_max_distance,
+                                            previous=self.recognizer)
+        except (cv2.error, RuntimeError) as e:
+            print(f"Warning: Could not train the {backend} recognizer, using histograms: {e}")
+            return HistogramRecognizer(gallery)
+        print(f"✓ {backend.upper()} recognizer {how} ({len(photos)} photos, {path})")
+        return recognizer
+
+    @property
+    def registry(self):
+        """User registry of the photo folder, opened on first use"""
+        if self._registry is None or self._registry.folder != self.database_folder:
+            self._registry = UserRegistry(self.database_folder, self.registry_file)
+        return self._registry
 
     def load_database(self):
-        """Load all faces from the training photos folder"""
+        """Load all faces from the training photos folder or a built gallery file"""
         print("\n=== LOADING FACE DATABASE ===")
         
+        if os.path.isfile(self.database_folder):
+            return self.load_gallery_file(self.database_folder)
+        
         if not os.path.exists(self.database_folder):
             print(f"Error: Database folder '{self.database_folder}' not found.")
             return False
         
-        image_files = [f for f in os.listdir(self.database_folder) 
-                      if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+        # One scandir pass; only photos whose size or mtime changed are re-parsed
+        self.registry.sync()
+        photos = self.registry.photos()
         
-        if not image_files:
+        if not photos:
             print(f"Error: No images found in '{self.database_folder}'.")
             return False
         
-        for filename in image_files:
-            # Parse filename: Name_ID.jpg
-            name_parts = filename.rsplit('.', 1)[0]
-            
-            # Try to extract name and ID
-            if '_' in name_parts:
-                parts = name_parts.rsplit('_', 1)
-                # Check if last part is numeric (ID)
-                if parts[-1].isdigit():
-                    name = parts[0].replace('_', ' ')
-                    user_id = parts[-1]
-                else:
-                    # No ID in filename, use whole name
-                    name = name_parts.replace('_', ' ')
-                    user_id = "0000"
+        cache = self._load_cache() if self.use_cache else {}
+        new_cache = {}
+        cache_hits = 0
+        
+        # Reuse cached crops, and collect new or changed photos for detection
+        to_detect = {}
+        for image_path, _, _, size, mtime_ns in photos:
+            stat = PhotoStat(size, mtime_ns)
+            entry = self._cached_entry(cache, image_path, stat)
+            if entry is not None:
+                new_cache[image_path] = entry
+                cache_hits += 1
             else:
-                name = name_parts.replace('_', ' ')
-                user_id = "0000"
-            
-            # Load and process image
-            image_path = os.path.join(self.database_folder, filename)
-            img = cv2.imread(image_path)
-            
-            if img is None:
-                print(f"Warning: Could not load {filename}")
+                to_detect[image_path] = stat
+        
+        # Results are reported as each photo finishes
+        # Only load the cascade when some photo actually needs detecting
+        needs_cascade = any(not is_face_template(path) for path in to_detect)
+        reported = self._process_new_photos(to_detect, new_cache,
+                                            self.face_cascade if needs_cascade else None)
+        
+        # Build the database in folder order, whatever order detection finished in.
+        # Entries for deleted files are simply not carried over.
+        entries = {}
+        for image_path, name, user_id, _, _ in photos:
+            entry = new_cache.get(image_path)
+            if entry is None:
                 continue
+            entries[image_path] = entry
             
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
-            
-            if len(faces) == 0:
-                print(f"Warning: No face detected in {filename}")
+            filename = os.path.basename(image_path)
+            if entry["face"] is None:
+                if image_path not in reported and not entry.get("evicted"):
+                    print(f"Warning: No face detected in {filename}")
                 continue
             
-            # Get the largest face
-            (x, y, w, h) = max(faces, key=lambda face: face[2] * face[3])
-            face_img = gray[y:y+h, x:x+w]
-            face_img = cv2.resize(face_img, (100, 100))
-            
-            # Store face data
-            if name not in self.known_faces:
-                self.known_faces[name] = []
-                self.user_ids[name] = user_id
-                self.user_dictionary[name] = user_id
-            
-            self.known_faces[name].append(face_img)
             print(f"✓ Loaded: {name} (ID: {user_id}) from {filename}")
         
+        self._install_database(entries)
+        
+        if self.use_cache:
+            print(f"\n✓ Cache: {cache_hits} reused, {len(new_cache) - cache_hits} processed, "
+                  f"{len(set(cache) - set(new_cache))} dropped")
+            self._save_cache(new_cache)
+        
+        return self._report_database()
+
+    def _report_database(self):
+        """Print the loaded users. Returns False if there are none."""
         if not self.known_faces:
             print("Error: No valid faces loaded.")
             return False
         
         print(f"\n✓ Database loaded: {len(self.known_faces)} users")
-        for name, id_num in self.user_ids.items():
-            print(f"  - {name}: {len(self.known_faces[name])} photo(s), ID: {id_num}")
+        for user, id_num in self.user_ids.items():
+            print(f"  - {self.user_names[user]}: {len(self.known_faces[user])} photo(s), ID: {id_num}")
         
         return True
 
-    def compare_faces(self, face_img, name):
-        """Simple face comparison using template matching"""
-        if name not in self.known_faces:
-            return 0.0
-        
-        face_img = cv2.resize(face_img, (100, 100))
-        
-        # Compare with all stored faces for this person
-        similarities = []
-        for stored_face in self.known_faces[name]:
-            # Normalize both images
-            face_norm = cv2.normalize(face_img, None, 0, 255, cv2.NORM_MINMAX)
-            stored_norm = cv2.normalize(stored_face, None, 0, 255, cv2.NORM_MINMAX)
+    def memory_report(self):
+        """
+        Bytes held by each part of the loaded database: the face store, the
+        gallery's features and the per-photo cache entries. OpenCV recognizer
+        models are not included.
+        """
+        report = {f"store.{key}": value for key, value in self.face_store.memory_report().items()}
+        report.update({f"gallery.{key}": value for key, value in self.gallery.memory_report().items()})
+        report["photo_entries"] = sys.getsizeof(self.photo_entries) + sum(
+            sys.getsizeof(entry) + sum(sys.getsizeof(value) for value in entry.values())
+            for entry in self.photo_entries.values())
+        report["user_ids"] = sys.getsizeof(self.user_dictionary)
+        return report
+
+    def load_gallery_file(self, path):
+        """
+        Load a gallery file written by build_gallery_file. Crops and
+        features stay memory-mapped, so startup reads almost nothing.
+        """
+        try:
+            gallery_file = GalleryFile(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error: Could not open gallery file '{path}': {e}")
+            return False
+        
+        # The store wraps the mapped crops; the template cap does not apply here
+        users = []
+        for i, name in enumerate(gallery_file.names):
+            user_rows = gallery_file.user_rows(i)
+            users.append(UserRecord(name, gallery_file.user_ids[i], user_rows.start,
+                                    user_rows.stop - user_rows.start))
+        store = FaceStore(users, gallery_file.faces,
+                          keys=[source["file"] for source in gallery_file.sources])
+        
+        self.photo_entries = {}
+        self.face_store = store
+        self.known_faces = store.known_faces()
+        self.user_dictionary = self.user_ids = store.user_ids()
+        self.user_names = store.display_names()
+        gallery = FaceGallery.from_features(store.user_keys, gallery_file.offsets,
+                                            gallery_file.features)
+        gallery.set_precision(self.feature_precision)
+        gallery.use_shortlist(self.shortlist_k, self.coarse_bins)
+        
+        # Photo rows by source file, for training an OpenCV recognizer
+        rows = {source: row for row, source in enumerate(store.keys)}
+        self.recognizer = self._build_recognizer(
+            gallery, {source: (store.users[store.labels[row]].key, gallery_file.sources[row]["hash"])
+                      for source, row in rows.items()},
+            lambda source: store.faces[rows[source]])
+        self.gallery = gallery
+        print(f"✓ Mapped {len(gallery_file.features)} face(s) from {path}")
+        return self._report_database()
+
+    def build_gallery_file(self, path):
+        """Write the database loaded from the photo folder to one gallery file"""
+        if not self.photo_entries:
+            print("Error: Load the database from a photo folder before building a gallery file.")
+            return False
+        
+        store = self.face_store
+        records = []
+        for row, image_path in enumerate(store.keys):
+            user = store.users[store.labels[row]]
+            records.append({"name": user.name, "user_id": user.user_id, "face": store.faces[row],
+                            "hist": store.hists[row], "source": os.path.basename(image_path),
+                            "hash": self.photo_entries[image_path]["hash"]})
+        
+        count = write_gallery_file(path, records)
+        print(f"✓ Gallery file written: {path} ({len(self.known_faces)} users, {count} faces, "
+              f"{os.path.getsize(path) / 1024:.0f} KB)")
+        return True
+
+    def apply_photo_changes(self, changed_paths, removed_paths):
+        """
+        Update the running database for photos that were added, changed or
+        removed. Only those photos are read; the rest come from memory.
+        """
+        with self._reload_lock:
+            self.registry.update(changed_paths, removed_paths)
+            entries = dict(self.photo_entries)
+            for image_path in removed_paths:
+                if entries.pop(image_path, None) is not None:
+                    print(f"✓ Removed: {os.path.basename(image_path)}")
             
-            # Calculate similarity using histogram comparison
-            hist1 = cv2.calcHist([face_norm], [0], None, [256], [0, 256])
-            hist2 = cv2.calcHist([stored_norm], [0], None, [256], [0, 256])
+            stats = {}
+            for image_path in changed_paths:
+                try:
+                    stats[image_path] = os.stat(image_path)
+                except OSError:
+                    entries.pop(image_path, None)
             
-            similarity = cv2.compareHist(hist1, hist2, cv2.HISTCMP_CORREL)
-            similarities.append(similarity)
-        
-        # Return best match
-        return max(similarities) if similarities else 0.0
+            # The camera thread owns self.face_cascade, so detect with a separate one
+            self._process_new_photos(stats, entries, face_cascade=self._reload_cascade)
+            for image_path in stats:
+                entry = entries.get(image_path)
+                if entry is not None and entry["face"] is not None:
+                    name, user_id = self.registry.photo(image_path) or \
+                        parse_user_filename(os.path.basename(image_path))
+                    print(f"✓ Loaded: {name} (ID: {user_id}) from {os.path.basename(image_path)}")
+            
+            # Keep folder order: unchanged photos first, then new ones
+            self._install_database(entries)
+            if self.use_cache:
+                self._save_cache(entries)
+            print(f"✓ Database reloaded: {len(self.known_faces)} users")
+
+    def watch_database(self, interval=2.0):
+        """Reload added, changed and removed photos while the system runs"""
+        if os.path.isfile(self.database_folder):
+            print("Warning: A gallery file cannot be watched; rebuild it to pick up new photos.")
+            return None
+        if self.watcher is None:
+            self._reload_cascade = cv2.CascadeClassifier(
+                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            self.watcher = GalleryWatcher(self.database_folder, self.apply_photo_changes, interval)
+            self.watcher.start()
+            print(f"✓ Watching '{self.database_folder}' for changes every {interval:g}s")
+        return self.watcher
+
+    def compare_faces(self, face_img, name):
+        """Best histogram correlation between a face and one user's photos"""
+        return self.gallery.score(face_img, name)
+
+    def top_matches(self, face_img, k=5):
+        """Return the k best matching users as [(name, score), ...]"""
+        return self.gallery.top_k(face_img, k)
 
     def recognize_face(self, face_img):
         """Find best matching person"""
-        best_match = None
-        best_score = 0.0
-        
-        for name in self.known_faces.keys():
-            score = self.compare_faces(face_img, name)
-            if score > best_score:
-                best_score = score
-                best_match = name
+        # One lookup against the whole gallery
+        matches = self.recognizer.match_batch([face_img])
         
         # Threshold for recognition (adjust as needed)
-        if best_score > 0.5:  # 50% similarity
-            return best_match, best_score
+        if matches and matches[0][0] is not None and matches[0][1] > self.match_threshold:
+            return matches[0]
         else:
             return None, 0.0
 
     def show_next_page(self, user_name):
         """Success page after login"""
-        success_window = tk.Toplevel()
+        import tkinter as tk
+        success_window = tk.Toplevel(self.root)
         success_window.title("System Unlocked")
         success_window.geometry("400x250")
         
@@ -169,127 +636,413 @@ class SimpleFaceIDSystem:
         
         success_window.wait_window()
 
-    def request_id_popup(self, name):
+    def request_id_popup(self, user):
         """Ask for ID verification"""
+        from tkinter import simpledialog, messagebox
+        self.root  # dialogs need the hidden root to exist
         entered_id = simpledialog.askstring(
             "Security Check", 
-            f"Face Recognized: {name}\n\nPlease enter your ID Number:"
+            f"Face Recognized: {self.display_name(user)}\n\nPlease enter your ID Number:"
         )
         
         if entered_id is None:
             return False
 
-        required_id = self.user_dictionary.get(name)
-        
-        if entered_id == required_id:
-            self.log_activity(name, "ACCESS GRANTED")
+        if self.verify_id(user, entered_id):
             messagebox.showinfo("Access Granted", "Identity Confirmed.")
             return True
         else:
-            self.log_activity(name, f"ACCESS DENIED (Wrong ID: {entered_id})")
             messagebox.showerror("Access Denied", "ID Number did not match database.")
             return False
 
-    def start_camera(self):
-        """Start camera and begin face recognition"""
+    def verify_id(self, user, entered_id, score=None):
+        """Check an entered ID against a recognized user's and log the attempt"""
+        required_id = self.user_dictionary.get(user)
+        name = self.display_name(user)
+        
+        if entered_id == required_id:
+            self.metrics.count("granted")
+            self.log_activity(name, "ACCESS GRANTED", score=score)
+            return True
+        else:
+            self.metrics.count("denied")
+            self.log_activity(name, f"ACCESS DENIED (Wrong ID: {entered_id})", score=score)
+            return False
+
+    def open_camera(self):
+        """Open camera 1, falling back to camera 0. Returns None if neither works."""
         print("Trying to open camera 1...")
         video_capture = cv2.VideoCapture(1, cv2.CAP_DSHOW)
         
-        # Give it a moment to initialize
-        import time
-        time.sleep(1)
-        
-        if not video_capture.isOpened():
+        if not self._camera_ready(video_capture):
             print("Camera 1 not available, trying camera 0...")
             video_capture = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-            time.sleep(1)
             
-            if not video_capture.isOpened():
+            if not self._camera_ready(video_capture):
                 print("Error: Could not access any camera!")
                 print("Please make sure:")
                 print("  1. Camera is connected")
                 print("  2. No other app is using the camera")
                 print("  3. Camera permissions are enabled")
-                return
+                return None
         
-        print("\n=== CAMERA ACTIVE ===")
-        print("Press 'q' to quit\n")
+        return video_capture
+
+    def _camera_ready(self, video_capture, timeout=2.0):
+        """Wait for an opened camera's first frame, instead of sleeping a fixed time"""
+        if not video_capture.isOpened():
+            return False
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if video_capture.grab():
+                return True
+            time.sleep(0.02)
+        return False
+
+    def detect_faces(self, gray):
+        """Detect faces in a grayscale frame, returning full-resolution boxes"""
+        return self.face_detector.detect(gray)
+
+    def match_crops(self, crops):
+        """
+        Recognize face crops with one batched lookup in the recognizer.
+        Returns [(name, score), ...], with (None, 0.0) below the threshold.
+        """
+        if len(crops) == 0:
+            return []
+        with self.metrics.timer("compare"):
+            matches = self.recognizer.match_batch(crops)
+        self.metrics.count("recognitions", len(crops))
         
-        frame_count = 0
-        last_recognition_time = 0
-        recognition_cooldown = 30  # Process every 30 frames
+        results = []
+        for name, confidence in matches:
+            # Threshold for recognition (adjust as needed)
+            if confidence > self.match_threshold:
+                results.append((name, confidence))
+            else:
+                results.append((None, 0.0))
+        return results
+
+    def match_faces(self, gray, faces):
+        """
+        Recognize every face in a frame with one batched gallery lookup.
+        Returns [(box, name, score), ...].
+        """
+        boxes = [(x, y, w, h) for (x, y, w, h) in faces]
+        crops = [gray[y:y+h, x:x+w] for (x, y, w, h) in boxes]
+        return [(box, name, confidence)
+                for box, (name, confidence) in zip(boxes, self.match_crops(crops))]
+
+    def track_faces(self, frame_id, frame, gray, tracker=None, scheduler=None, detector=None):
+        """
+        Detection stage: detect faces and attach each one to its track.
+        When the scheduler skips detection (no budget left, or an idle scene
+        with no motion), the faces of the last detection are returned as
+        they were.
+        """
+        tracker = tracker or self.tracker
+        scheduler = scheduler or self.scheduler
+        detector = detector or self.face_detector
+        if not scheduler.should_detect(image=gray):
+            self.metrics.count("skipped_detections")
+            return tracker.tracked_faces()
         
-        while True:
-            ret, frame = video_capture.read()
-            if not ret:
-                print("Error: Could not read from camera.")
-                break
+        started = time.perf_counter()
+        faces = tracker.detect(frame_id, frame, gray, detector.detect)
+        scheduler.detected(len(faces), time.perf_counter() - started)
+        return faces
 
-            frame_count += 1
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Detect faces
-            faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+    def recognize_faces(self, frame_id, gray, faces, tracker=None, scheduler=None):
+        """
+        Recognition stage: label each tracked face.
+        Returns [(face, name, score), ...] where face is the TrackedFace
+        (so it still knows its track), name is None for unknown faces and
+        "Scanning..." while a face is held after a match. Only
+        new, uncertain or stale tracks are matched against the gallery,
+        when the scheduler says their turn has come; the rest reuse the
+        identity their track voted for.
+        """
+        tracker = tracker or self.tracker
+        scheduler = scheduler or self.scheduler
+        if not all(hasattr(face, "track") for face in faces):
+            faces = tracker.update(faces, frame_id)
+        
+        # Tracks still voting for someone a hot reload removed start over
+        user_names = self.user_names
+        for face in faces:
+            user = face.track.identity()[0]
+            if user is not None and user not in user_names:
+                face.track.reset_votes()
+        
+        now = scheduler.clock()
+        held = [scheduler.held(face.track, now) for face in faces]
+        to_match = [face for face, hold in zip(faces, held)
+                    if not hold and tracker.needs_recognition(face.track, frame_id)
+                    and scheduler.due(face.track, now)]
+        started = time.perf_counter()
+        for face, (_, name, confidence) in zip(to_match, self.match_faces(gray, to_match)):
+            face.track.add_vote(name, confidence, frame_id)
+        scheduler.recognized([face.track for face in to_match], time.perf_counter() - started, now)
+        tracker.stats["recognitions_run"] += len(to_match)
+        tracker.stats["recognitions_reused"] += held.count(False) - len(to_match)
+        self.metrics.count("recognitions_reused", held.count(False) - len(to_match))
+        
+        # Boxes stay TrackedFaces, so ID checks attach to the face's own track
+        results = []
+        for face, hold in zip(faces, held):
+            if hold:
+                results.append((face, "Scanning...", 0.0))
+                continue
             
-            for (x, y, w, h) in faces:
-                # Draw rectangle
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                
-                # Only process every N frames
-                if frame_count - last_recognition_time > recognition_cooldown:
-                    face_img = gray[y:y+h, x:x+w]
-                    
-                    # Recognize
-                    name, confidence = self.recognize_face(face_img)
-                    
-                    if name:
-                        last_recognition_time = frame_count
-                        
-                        cv2.putText(frame, f"{name}", (x, y-10), 
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-                        
-                        print(f"\n>>> Match: {name} (Confidence: {confidence:.2f})")
-                        
-                        # Show frame
-                        cv2.imshow('Face Recognition System', frame)
-                        cv2.waitKey(1)
-                        
-                        # Request ID
-                        access_granted = self.request_id_popup(name)
-                        
-                        if access_granted:
-                            cv2.destroyAllWindows()
-                            video_capture.release()
-                            self.show_next_page(name)
-                            return
-                        else:
-                            print("Access Denied. Continuing...\n")
-                    else:
-                        cv2.putText(frame, "Unknown", (x, y-10), 
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-                else:
-                    cv2.putText(frame, "Scanning...", (x, y-10), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+            name, _, confidence = face.track.identity()
+            if name:
+                scheduler.hold(face.track, now)
+                self.metrics.count("matches")
+            results.append((face, name, confidence))
+        return results
+
+    def draw_results(self, frame, faces, results):
+        """Draw face boxes and the most recent recognition labels"""
+        for (x, y, w, h) in faces:
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+        
+        for (x, y, w, h), name, _ in results:
+            if name == "Scanning...":
+                cv2.putText(frame, name, (x, y-10), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+            elif name:
+                cv2.putText(frame, self.display_name(name), (x, y-10), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+            else:
+                cv2.putText(frame, "Unknown", (x, y-10), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
+
+    def queue_id_checks(self, frame_id, results, tracker, verifier):
+        """Hand each newly matched face to the ID verifier"""
+        for box, user, confidence in results:
+            if not user or user == "Scanning..." or user not in self.user_names:
+                continue
             
-            cv2.imshow('Face Recognition System', frame)
+            # The track the face was recognized on, not whichever is nearest now;
+            # skip it if the tracker has dropped it since
+            track = getattr(box, "track", None)
+            if track is None or tracker.tracks.get(track.track_id) is not track or track.pending_name:
+                continue
             
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+            name = self.display_name(user)
+            if verifier.submit(track.track_id, user, confidence, name):
+                self.metrics.count("id_checks")
+                track.pending_name = name
+                print(f"\n>>> Match: {name} (Confidence: {confidence:.2f})")
+
+    def finish_id_check(self, request, entered_id, tracker, frame_id):
+        """Apply the answer to an ID check. Returns True if access was granted."""
+        if entered_id is None:
+            access_granted = False
+        else:
+            access_granted = self.verify_id(request.user, entered_id, request.score)
+        
+        track = tracker.tracks.get(request.track_id)
+        if track is not None:
+            track.pending_name = None
+            track.status = "ACCESS GRANTED" if access_granted else "ACCESS DENIED"
+            track.status_frame = frame_id
+        
+        if not access_granted:
+            # Give this face's next attempt a fresh hold and a fresh identity
+            if track is not None:
+                self.scheduler.hold(track)
+                track.reset_votes()
+            print("Access Denied. Continuing...\n")
+        return access_granted
+
+    def draw_tracks(self, frame, tracker, frame_id):
+        """Show pending ID checks and recent outcomes under each face"""
+        for track in tracker.active_tracks():
+            x, y, w, h = track.box
+            if track.pending_name:
+                cv2.putText(frame, f"Enter ID: {track.pending_name}", (x, y+h+25), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 165, 255), 2)
+            elif track.status and frame_id - track.status_frame < self.status_frames:
+                cv2.putText(frame, track.status, (x, y+h+25), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+    def start_camera(self, video_capture=None):
+        """Start camera (or an already opened capture) and begin face recognition"""
+        if video_capture is None:
+            video_capture = self.open_camera()
+        if video_capture is None:
+            return
+        
+        print("\n=== CAMERA ACTIVE ===")
+        print("Press 'q' to quit\n")
+        
+        # Capture, detection and recognition each run on their own thread;
+        # this loop only displays the freshest frame and hands matches to
+        # the ID verifier, which never blocks the loop.
+        pipeline = FramePipeline(video_capture, self.track_faces, self.recognize_faces,
+                                 queue_size=self.pipeline_queue_size, metrics=self.metrics)
+        tracker = self.tracker
+        self.pipeline = pipeline
+        granted = []
+        
+        def on_verification(request, entered_id):
+            if self.finish_id_check(request, entered_id, tracker, pipeline.latest_frame[0]):
+                granted.append(request.name)
+        
+        # The Tk root is only created once the first ID window opens
+        verifier = IdVerifier(lambda: self.root, on_verification)
+        self.verifier = verifier
+        pipeline.start()
+        
+        shown_id = None
+        try:
+            while not granted:
+                with self.metrics.timer("dialogs"):
+                    verifier.poll()
+                
+                # Short wait so the ID window stays responsive
+                latest = pipeline.wait_for_frame(shown_id, timeout=0.05)
+                if latest is None:
+                    if not pipeline.running:
+                        print(f"Error: {pipeline.error}")
+                        break
+                    continue
+                
+                shown_id, frame = latest
+                
+                # The detection stage drops tracks of people who walked away
+                for request in verifier.pending():
+                    if request.track_id not in tracker.tracks:
+                        print(f"{request.name} left before entering an ID.")
+                        verifier.cancel(request.track_id)
+                
+                # Queue an ID check for each newly matched face
+                item = pipeline.result_queue.get_nowait()
+                if item is not None:
+                    frame_id, _, results = item
+                    self.queue_id_checks(frame_id, results, tracker, verifier)
+                
+                with self.metrics.timer("display"):
+                    frame = frame.copy()
+                    self.draw_results(frame, pipeline.latest_faces[1], pipeline.latest_results[1])
+                    self.draw_tracks(frame, tracker, shown_id)
+                    cv2.imshow('Face Recognition System', frame)
+                    key = cv2.waitKey(1) & 0xFF
+                
+                if key == ord('q'):
+                    break
+        finally:
+            pipeline.stop()
+            for request in verifier.pending():
+                verifier.cancel(request.track_id)
+            print(f"Pipeline stats: {pipeline.stats()}")
+            print(f"Tracker stats: {tracker.summary(time.time() - pipeline.started_at)}")
+            print(f"Scheduler stats: {self.scheduler.summary()}")
 
         video_capture.release()
         cv2.destroyAllWindows()
+        
+        if granted:
+            from tkinter import messagebox
+            messagebox.showinfo("Access Granted", "Identity Confirmed.")
+            self.show_next_page(granted[0])
 
 # --- MAIN ---
 if __name__ == "__main__":
-    app = SimpleFaceIDSystem()
+    parser = argparse.ArgumentParser(description="Simple face recognition system")
+    parser.add_argument("--database", default="training photos",
+                        help="photo folder, or a gallery file made with --build-gallery")
+    parser.add_argument("--build-gallery", metavar="FILE",
+                        help="load the photo folder, write it to a gallery file and exit")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes used to load new photos (0 = one per CPU core)")
+    parser.add_argument("--detect-scale", type=float, nargs="+", default=[1.0],
+                        help="detector pyramid, e.g. 0.5 1.0 (see face_detection.py --calibrate)")
+    parser.add_argument("--face-distance", type=float, nargs=2, metavar=("NEAR", "FAR"),
+                        help="expected distance to the gate in meters, limits searched face sizes")
+    parser.add_argument("--recognizer", choices=BACKENDS, default="histogram",
+                        help="face recognizer backend (compare them with face_recognizers.py --compare)")
+    parser.add_argument("--max-distance", type=float,
+                        help="OpenCV recognizer distance that scores 0; half of it is the match threshold")
+    add_gallery_arguments(parser)
+    add_store_arguments(parser)
+    parser.add_argument("--memory-report", action="store_true",
+                        help="print the bytes held by each part of the loaded database")
+    add_tracker_arguments(parser)
+    add_scheduler_arguments(parser)
+    parser.add_argument("--metrics", metavar="TARGET",
+                        help="export timings and counters to a file or HOST:PORT (also FACEID_METRICS)")
+    parser.add_argument("--metrics-format", choices=["json", "prometheus"],
+                        help="metrics file format (default: prometheus for .prom files, else json)")
+    parser.add_argument("--metrics-interval", type=float, default=5.0,
+                        help="seconds between metrics file snapshots")
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="reload added, changed or removed photos while running")
+    parser.add_argument("--log-jsonl", action="store_true",
+                        help="write access log records as JSON lines")
+    parser.add_argument("--log-rotate-mb", type=float,
+                        help="start a new access log once it reaches this size")
+    parser.add_argument("--log-rotate-daily", action="store_true",
+                        help="start a new access log every day")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="print how long imports, model load, gallery load and camera open took")
+    args = parser.parse_args()
+    
+    profile = StartupProfile(args.startup_profile, started_at=_import_started)
+    profile.add("imports", IMPORT_SECONDS)
+    
+    with profile.phase("app init"):
+        app = SimpleFaceIDSystem(headless=bool(args.build_gallery))
+    app.database_folder = args.database
+    app.load_workers = args.workers
+    app.tracker = tracker_from_args(args)
+    app.shortlist_k, app.coarse_bins = args.shortlist, args.coarse_bins
+    app.max_templates, app.eviction = args.max_templates, args.eviction
+    app.feature_precision = args.feature_precision
+    app.recognizer_backend, app.recognizer_max_distance = args.recognizer, args.max_distance
+    app.scheduler = scheduler_from_args(args)
+    app.access_log.json_lines = args.log_jsonl
+    app.access_log.rotate_daily = args.log_rotate_daily
+    if args.log_rotate_mb:
+        app.access_log.rotate_bytes = int(args.log_rotate_mb * 1024 * 1024)
     
     print("=" * 60)
     print("  SIMPLE FACE RECOGNITION SYSTEM")
     print("=" * 60)
     
-    if app.load_database():
+    if args.build_gallery:
+        if not (app.load_database() and app.build_gallery_file(args.build_gallery)):
+            raise SystemExit(1)
+        raise SystemExit(0)
+    
+    with profile.phase("gallery load"):
+        loaded = app.load_database()
+    
+    if loaded and args.memory_report:
+        report = app.memory_report()
+        print("\n=== DATABASE MEMORY ===")
+        for component, size in sorted(report.items(), key=lambda item: -item[1]):
+            print(f"  {component:<26}{size / 1e6:>10.2f} MB")
+        print(f"  {'total':<26}{sum(report.values()) / 1e6:>10.2f} MB")
+    
+    if loaded:
+        with profile.phase("model load"):
+            app.face_detector = ScaledFaceDetector(app.face_cascade, scales=args.detect_scale,
+                                                   distance_range=args.face_distance)
+        if args.watch:
+            app.watch_database(args.watch)
+        exporter = start_metrics(app.metrics, args.metrics, args.metrics_format, args.metrics_interval)
+        with profile.phase("camera open"):
+            video_capture = app.open_camera()
+        profile.report()
         print("=" * 60)
-        app.start_camera()
+        try:
+            if video_capture is not None:
+                app.start_camera(video_capture)
+        finally:
+            if exporter is not None:
+                exporter.stop()
     else:
         print("\n" + "=" * 60)
         print("SETUP REQUIRED:")
@@ -1,10 +1,24 @@
+import time
+_import_started = time.perf_counter()
 import cv2
-import face_recognition
-import tkinter as tk
-from tkinter import simpledialog, messagebox
 import sys
+import argparse
 import numpy as np
-from datetime import datetime
+from access_log import AccessLogWriter
+from encoding_index import EncodingIndex
+from face_tracker import FaceTracker
+from frame_scheduler import FrameScheduler, add_scheduler_arguments, scheduler_from_args
+from metrics import Metrics, start_metrics
+from startup_profile import StartupProfile
+
+# face_recognition (dlib and its models) and Tkinter are imported on first use
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+
+def load_face_models():
+    """Import face_recognition, which loads the dlib models"""
+    import face_recognition
+    return face_recognition
 
 class FaceIDSystem:
     def __init__(self):
@@ -15,38 +29,61 @@ class FaceIDSystem:
             "Staff_Member": "9999"
         }
         
-        self.known_encodings = []
-        self.known_names = []
+        # All known encodings in one (N x 128) float32 matrix
+        self.index = EncodingIndex()
+        self.tolerance = 0.6
+        
+        # Above this many encodings, lookups use the approximate IVF index
+        self.ivf_threshold = 50000
+        
+        # Faces are tracked across frames so known people are not re-encoded,
+        # and the scheduler decides per frame whether to detect and encode
+        self.tracker = FaceTracker()
+        self.scheduler = FrameScheduler()
+        
+        # Access attempts are written in batches off the camera thread
+        self.access_log = AccessLogWriter("access_logs.txt")
         
-        # Initialize Tkinter (hidden)
-        self.root = tk.Tk()
-        self.root.withdraw() 
+        # Stage timers and counters, off unless FACEID_METRICS is set
+        self.metrics = Metrics()
+        
+        # Hidden Tkinter root, created the first time a window is needed
+        self._root = None
+
+    @property
+    def root(self):
+        if self._root is None:
+            import tkinter as tk
+            self._root = tk.Tk()
+            self._root.withdraw()
+        return self._root
 
-    def log_activity(self, name, status):
+    def log_activity(self, name, status, score=None, stream_id=None):
         """
-        Writes the entry attempt to a text file with a timestamp.
+        Writes the entry attempt to the access log with a timestamp.
+        The write itself happens on a background thread.
         """
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] User: {name} | Status: {status}\n"
-        
-        try:
-            with open("access_logs.txt", "a") as f:
-                f.write(log_entry)
-            print(f" >> Logged: {log_entry.strip()}")
-        except Exception as e:
-            print(f"Error writing to log: {e}")
+        self.access_log.log(name, status, score=score, stream_id=stream_id)
+
+    @property
+    def known_encodings(self):
+        return self.index.encodings
+
+    @property
+    def known_names(self):
+        return self.index.names
 
     def load_authorized_face(self, image_path, name):
         """
         Loads a photo and learns the face.
         """
+        face_recognition = load_face_models()
         try:
             print(f"Loading biometric data for {name}...")
             image = face_recognition.load_image_file(image_path)
             encoding = face_recognition.face_encodings(image)[0]
             
-            self.known_encodings.append(encoding)
-            self.known_names.append(name)
+            self.index.add(encoding, name)
             print(" > Data loaded successfully.")
         except IndexError:
             print(f"Error: Could not find a face in {image_path}.")
@@ -59,7 +96,8 @@ class FaceIDSystem:
         """
         The 'Next Page' GUI after successful login.
         """
-        success_window = tk.Toplevel()
+        import tkinter as tk
+        success_window = tk.Toplevel(self.root)
         success_window.title("System Unlocked")
         success_window.geometry("400x250")
         
@@ -79,6 +117,9 @@ class FaceIDSystem:
         """
         Opens a graphical popup asking for the ID.
         """
+        from tkinter import simpledialog, messagebox
+        self.root  # dialogs need the hidden root to exist
+        
         # Prompt user for input via popup
         entered_id = simpledialog.askstring(
             "Security Check", 
@@ -93,58 +134,100 @@ class FaceIDSystem:
         required_id = self.user_dictionary.get(name)
         
         if entered_id == required_id:
+            self.metrics.count("granted")
             self.log_activity(name, "ACCESS GRANTED")
             messagebox.showinfo("Access Granted", "Identity Confirmed.")
             return True
         else:
+            self.metrics.count("denied")
             self.log_activity(name, f"ACCESS DENIED (Wrong ID: {entered_id})")
             messagebox.showerror("Access Denied", "ID Number did not match database.")
             return False
 
-    def start_camera(self):
+    def start_camera(self, video_capture=None):
+        face_recognition = load_face_models()
+        
         # 0 is usually the default webcam
-        video_capture = cv2.VideoCapture(0)
+        if video_capture is None:
+            video_capture = cv2.VideoCapture(0)
         print("\n--- CAMERA ACTIVE: LOOK AT THE CAMERA ---")
         print("--- Press 'q' to quit manual override ---")
         
-        process_this_frame = True
+        scheduler = self.scheduler
+        frame_id = 0
+        started = time.time()
+        
+        if len(self.index) > self.ivf_threshold and self.index.centroids is None:
+            print(f"Indexing {len(self.index)} encodings...")
+            self.index.build_ivf()
 
         while True:
             # 1. Grab a single frame of video
-            ret, frame = video_capture.read()
+            with self.metrics.timer("capture"):
+                ret, frame = video_capture.read()
             if not ret:
                 print("Error: Could not read from camera.")
                 break
 
-            # 2. Resize frame of video to 1/4 size for faster processing
-            small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-            rgb_small_frame = np.ascontiguousarray(small_frame[:, :, ::-1])
-
-            # 3. Process every other frame to save CPU
-            if process_this_frame:
-                face_locations = face_recognition.face_locations(rgb_small_frame)
-                face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+            frame_id += 1
+            self.metrics.count("frames")
 
-                for face_encoding in face_encodings:
-                    # Check for matches
-                    matches = face_recognition.compare_faces(self.known_encodings, face_encoding)
-                    name = "Unknown"
+            # 2. Resize frame of video to 1/4 size for faster processing
+            with self.metrics.timer("convert"):
+                small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
+                rgb_small_frame = np.ascontiguousarray(small_frame[:, :, ::-1])
 
-                    face_distances = face_recognition.face_distance(self.known_encodings, face_encoding)
-                    best_match_index = np.argmin(face_distances)
+            # 3. Detect and encode only when the scheduler says so; while nobody
+            # is in view it only detects when something moves
+            now = scheduler.clock()
+            if scheduler.should_detect(now, small_frame):
+                detect_started = time.perf_counter()
+                with self.metrics.timer("detect"):
+                    face_locations = face_recognition.face_locations(rgb_small_frame)
+                scheduler.detected(len(face_locations), time.perf_counter() - detect_started, now)
+                self.metrics.count("faces_detected", len(face_locations))
+                faces = self.tracker.update([(left, top, right - left, bottom - top)
+                                             for (top, right, bottom, left) in face_locations], frame_id)
 
-                    if matches[best_match_index]:
-                        name = self.known_names[best_match_index]
+                # Only new, uncertain or stale tracks whose turn has come are
+                # encoded, in one distance pass
+                to_encode = [face for face in faces
+                             if not scheduler.held(face.track, now)
+                             and self.tracker.needs_recognition(face.track, frame_id)
+                             and scheduler.due(face.track, now)]
+                if to_encode:
+                    encode_started = time.perf_counter()
+                    with self.metrics.timer("encode"):
+                        face_encodings = face_recognition.face_encodings(
+                            rgb_small_frame, [(y, x + w, y + h, x) for (x, y, w, h) in to_encode])
+                    with self.metrics.timer("compare"):
+                        matches = self.index.search(face_encodings, self.tolerance)
+                    for face, (name, distance, margin) in zip(to_encode, matches):
+                        face.track.add_vote(name, 1.0 - distance, frame_id)
+                    scheduler.recognized([face.track for face in to_encode],
+                                         time.perf_counter() - encode_started, now)
+                self.tracker.stats["recognitions_run"] += len(to_encode)
+                self.tracker.stats["recognitions_reused"] += len(faces) - len(to_encode)
+                self.metrics.count("recognitions", len(to_encode))
+                self.metrics.count("recognitions_reused", len(faces) - len(to_encode))
 
+                for face in faces:
+                    if scheduler.held(face.track, now):
+                        continue
+                    name, confidence, score = face.track.identity()
+                    if name is not None:
+                        self.metrics.count("matches")
                         # --- MATCH FOUND ---
                         # Show the frame briefly so user sees the lock-on
                         cv2.imshow('Security Gate', frame)
                         cv2.waitKey(1)
                         
-                        print(f"Match found: {name}. Requesting ID...")
+                        print(f"Match found: {name} (distance {1.0 - score:.2f}, "
+                              f"{confidence:.0%} of {face.track.vote_count} votes). Requesting ID...")
                         
                         # Trigger the popup logic
-                        access_granted = self.request_id_popup(name)
+                        with self.metrics.timer("dialogs"):
+                            access_granted = self.request_id_popup(name)
                         
                         if access_granted:
                             # Clean up camera to show next page clearly
@@ -157,28 +240,61 @@ class FaceIDSystem:
                             # Exit script completely after success
                             return 
                         else:
+                            # Wait a moment, then recognize this face again before the next attempt
+                            face.track.reset_votes()
+                            scheduler.hold(face.track)
                             print("Access Denied. Retrying surveillance...")
                             
-            process_this_frame = not process_this_frame
+            else:
+                # Frames skipped to stay within the CPU budget or on a static scene
+                self.metrics.count("skipped_detections")
 
             # Display the resulting image
-            cv2.imshow('Security Gate', frame)
+            with self.metrics.timer("display"):
+                cv2.imshow('Security Gate', frame)
+                key = cv2.waitKey(1) & 0xFF
 
             # Hit 'q' on the keyboard to quit!
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            if key == ord('q'):
                 break
 
+        print(f"Tracker stats: {self.tracker.summary(time.time() - started)}")
+        print(f"Scheduler stats: {scheduler.summary()}")
         video_capture.release()
         cv2.destroyAllWindows()
 
 # --- EXECUTION BLOCK ---
 if __name__ == "__main__":
-    app = FaceIDSystem()
+    parser = argparse.ArgumentParser(description="Face ID security gate")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="print how long imports, model load, gallery load and camera open took")
+    add_scheduler_arguments(parser)
+    args = parser.parse_args()
+    
+    profile = StartupProfile(args.startup_profile, started_at=_import_started)
+    profile.add("imports", IMPORT_SECONDS)
+    
+    with profile.phase("app init"):
+        app = FaceIDSystem()
+        app.scheduler = scheduler_from_args(args)
+    with profile.phase("model load"):
+        load_face_models()
     
     # SETUP:
     # Ensure 'admin.jpg' exists in the folder.
     # 'Administrator' is the key used in the dictionary at the top of the code.
-    app.load_authorized_face("admin.jpg", "Administrator")
+    with profile.phase("gallery load"):
+        app.load_authorized_face("admin.jpg", "Administrator")
+    
+    with profile.phase("camera open"):
+        video_capture = cv2.VideoCapture(0)
+    profile.report()
     
     # RUN:
-    app.start_camera()
+    # Set FACEID_METRICS to a file or HOST:PORT to export stage timings
+    exporter = start_metrics(app.metrics)
+    try:
+        app.start_camera(video_capture)
+    finally:
+        if exporter is not None:
+            exporter.stop()
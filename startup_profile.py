@@ -0,0 +1,38 @@
+"""
+Startup timing report for --startup-profile.
+Collects how long each startup phase took (imports, model load, gallery
+load, camera open) and prints them with the total time to ready.
+"""
+
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile:
+    def __init__(self, enabled=True, started_at=None):
+        """started_at is a time.perf_counter() value; defaults to now"""
+        self.enabled = enabled
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.phases = []
+
+    def add(self, name, seconds):
+        self.phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name):
+        """Time the body of a with block as one phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def report(self):
+        """Print the phases and the total since started_at"""
+        if not self.enabled:
+            return
+        total = time.perf_counter() - self.started_at
+        print("\n=== STARTUP PROFILE ===")
+        for name, seconds in self.phases:
+            print(f"  {name:<14} {seconds * 1000:8.1f} ms")
+        print(f"  {'time to ready':<14} {total * 1000:8.1f} ms")
@@ -0,0 +1,207 @@
+"""
+Indexed registry of the people in the training photos folder.
+Photo names follow Name_ID.jpg; face templates saved by burst enrollment
+are Name_ID.face01.png, Name_ID.face02.png, ... Every photo is parsed once and kept in a
+small SQLite index (path, name, ID, size, mtime) with indexes on ID and
+name, so tools can list users or look one up without rescanning the
+folder. sync() brings the index up to date with one os.scandir pass and
+only re-parses photos whose size or mtime changed.
+
+    python user_registry.py                 # list users
+    python user_registry.py --id 5555       # look up one user
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+
+from gallery_watcher import diff_snapshots, scan_folder
+
+REGISTRY_VERSION = 2
+DEFAULT_ID = "0000"
+
+# Marks an already cropped and aligned face, see enrollment.py
+TEMPLATE_TAG = "face"
+
+
+def _split_template(stem):
+    """('Name_ID', template number or None) for a filename without extension"""
+    base, dot, tag = stem.rpartition('.')
+    if dot and tag.startswith(TEMPLATE_TAG) and tag[len(TEMPLATE_TAG):].isdigit():
+        return base, int(tag[len(TEMPLATE_TAG):])
+    return stem, None
+
+
+def template_index(filename):
+    """Number of a face template written by burst enrollment, or None for other photos"""
+    return _split_template(os.path.basename(filename).rsplit('.', 1)[0])[1]
+
+
+def is_face_template(filename):
+    """Whether a photo is an already cropped face written by burst enrollment"""
+    return template_index(filename) is not None
+
+
+def template_filename(name, user_id, index, ext=".png"):
+    """Filename of one enrolled face template, e.g. 'John_Doe_5555.face01.png'"""
+    return f"{name.strip().replace(' ', '_')}_{user_id}.{TEMPLATE_TAG}{index:02d}{ext}"
+
+
+def parse_user_filename(filename):
+    """Parse 'Name_ID.jpg' (or a 'Name_ID.face01.png' template) into (name, user_id)"""
+    name_parts = _split_template(filename.rsplit('.', 1)[0])[0]
+
+    # Try to extract name and ID
+    if '_' in name_parts:
+        parts = name_parts.rsplit('_', 1)
+        # Check if last part is numeric (ID)
+        if parts[-1].isdigit():
+            return parts[0].replace('_', ' '), parts[-1]
+
+    # No ID in filename, use whole name
+    return name_parts.replace('_', ' '), DEFAULT_ID
+
+
+def user_key(name, user_id):
+    """
+    Key of a person in the loaded database: their ID, so two people with
+    the same name never merge. Photos without an ID all share DEFAULT_ID
+    and are told apart by name instead. Keys are never shown on screen;
+    the ID is the second factor of the gate.
+    """
+    return f"{DEFAULT_ID}:{name}" if user_id == DEFAULT_ID else user_id
+
+
+class UserRegistry:
+    def __init__(self, folder="training photos", path="user_registry.sqlite"):
+        """Open (or create) the index for a photo folder"""
+        self.folder = folder
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS photos (
+                path TEXT PRIMARY KEY, filename TEXT, name TEXT, user_id TEXT,
+                size INTEGER, mtime_ns INTEGER);
+            CREATE INDEX IF NOT EXISTS photos_user_id ON photos (user_id);
+            CREATE INDEX IF NOT EXISTS photos_name ON photos (name);
+        """)
+
+        # Start over if the index belongs to another folder or format
+        meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        if meta.get("folder") != os.path.abspath(folder) or meta.get("version") != str(REGISTRY_VERSION):
+            with self._db:
+                self._db.execute("DELETE FROM photos")
+                self._db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                     [("folder", os.path.abspath(folder)),
+                                      ("version", str(REGISTRY_VERSION))])
+
+    def close(self):
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM photos").fetchone()[0]
+
+    def snapshot(self):
+        """{path: (size, mtime_ns)} as last indexed"""
+        with self._lock:
+            return {path: (size, mtime) for path, size, mtime
+                    in self._db.execute("SELECT path, size, mtime_ns FROM photos")}
+
+    def sync(self):
+        """
+        Update the index from the folder. Returns (changed, removed) paths;
+        changed includes added photos.
+        """
+        scan = scan_folder(self.folder)
+        changed, removed = diff_snapshots(self.snapshot(), scan)
+        self.update(changed, removed, scan)
+        return changed, removed
+
+    def update(self, changed_paths, removed_paths, states=None):
+        """
+        Re-index specific photos, e.g. ones reported by GalleryWatcher.
+        states is {path: (size, mtime_ns)} from a scan; other paths are stat'ed.
+        """
+        removed_paths = list(removed_paths)
+        rows = []
+        for path in changed_paths:
+            state = states.get(path) if states else None
+            if state is None:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    removed_paths.append(path)
+                    continue
+                state = (stat.st_size, stat.st_mtime_ns)
+            filename = os.path.basename(path)
+            name, user_id = parse_user_filename(filename)
+            rows.append((path, filename, name, user_id) + tuple(state))
+
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM photos WHERE path = ?", [(path,) for path in removed_paths])
+            self._db.executemany("INSERT OR REPLACE INTO photos VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def photos(self):
+        """[(path, name, user_id, size, mtime_ns), ...] in the order photos were indexed"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT path, name, user_id, size, mtime_ns FROM photos ORDER BY rowid").fetchall()
+
+    def photo(self, path):
+        """(name, user_id) of one photo, or None"""
+        with self._lock:
+            return self._db.execute("SELECT name, user_id FROM photos WHERE path = ?", (path,)).fetchone()
+
+    def users(self):
+        """[(user_id, name, photo_count), ...] for every person"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT user_id, name, COUNT(*) FROM photos GROUP BY user_id, name "
+                "ORDER BY MIN(rowid)").fetchall()
+
+    def user(self, user_id):
+        """{name: [photo paths]} registered under one ID (several names if it is shared)"""
+        with self._lock:
+            rows = self._db.execute("SELECT name, path FROM photos WHERE user_id = ? ORDER BY rowid",
+                                    (user_id,)).fetchall()
+        found = {}
+        for name, path in rows:
+            found.setdefault(name, []).append(path)
+        return found
+
+    def find(self, name):
+        """IDs registered under a display name"""
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                "SELECT DISTINCT user_id FROM photos WHERE name = ? ORDER BY user_id", (name,))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List or look up users in the photo registry")
+    parser.add_argument("--database", default="training photos", help="photo folder")
+    parser.add_argument("--registry", default="user_registry.sqlite", help="index file")
+    parser.add_argument("--id", help="show one user ID")
+    parser.add_argument("--name", help="show the IDs registered under a name")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.database):
+        print(f"Error: Database folder '{args.database}' not found.")
+        raise SystemExit(1)
+
+    registry = UserRegistry(args.database, args.registry)
+    changed, removed = registry.sync()
+    print(f"✓ Registry: {len(registry)} photo(s), {len(changed)} indexed, {len(removed)} removed")
+
+    if args.id:
+        for name, paths in registry.user(args.id).items():
+            print(f"ID {args.id}: {name}")
+            for path in paths:
+                print(f"  - {os.path.basename(path)}")
+    elif args.name:
+        print(f"'{args.name}': {', '.join(registry.find(args.name)) or 'not found'}")
+    else:
+        for user_id, name, count in registry.users():
+            print(f"  {user_id:>8}  {name}  ({count} photo(s))")
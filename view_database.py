@@ -3,6 +3,8 @@ View what's in the face database
 """
 import os
 
+from user_registry import DEFAULT_ID, UserRegistry
+
 folder = "training photos"
 
 print("\n" + "="*60)
@@ -12,29 +14,20 @@ print("="*60)
 if not os.path.exists(folder):
     print(f"Error: '{folder}' folder not found!")
 else:
-    files = [f for f in os.listdir(folder) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+    registry = UserRegistry(folder)
+    registry.sync()
+    photos = registry.photos()
     
-    if not files:
+    if not photos:
         print("No images found!")
     else:
-        print(f"\nFound {len(files)} image(s):\n")
+        print(f"\nFound {len(photos)} image(s):\n")
         
-        for idx, filename in enumerate(files, 1):
-            name_parts = filename.rsplit('.', 1)[0]
-            
-            if '_' in name_parts:
-                parts = name_parts.rsplit('_', 1)
-                if parts[-1].isdigit():
-                    name = parts[0].replace('_', ' ')
-                    user_id = parts[-1]
-                else:
-                    name = name_parts.replace('_', ' ')
-                    user_id = "0000 (DEFAULT)"
-            else:
-                name = name_parts.replace('_', ' ')
-                user_id = "0000 (DEFAULT)"
+        for idx, (path, name, user_id, _, _) in enumerate(photos, 1):
+            if user_id == DEFAULT_ID:
+                user_id = f"{DEFAULT_ID} (DEFAULT)"
             
-            print(f"{idx}. {filename}")
+            print(f"{idx}. {os.path.basename(path)}")
             print(f"   - Name: '{name}'")
             print(f"   - ID: '{user_id}'")
             print()